@@ -16,8 +16,13 @@ import sys
 import os
 import uuid
 import re
+import json
+import bisect
+import time
+import traceback
 
 from importlib import reload
+from contextlib import contextmanager
 
 from PySide2 import QtCore, QtWidgets, QtGui
 from PySide2.QtWidgets import QShortcut
@@ -30,11 +35,23 @@ if "builtin" in __name__:
     if CurrentDirectory not in sys.path:
         sys.path.append(CurrentDirectory)
     import Utils.WindowCreator as WindowCreator
+    import Utils.NameValidation as NameValidation
+    import Utils.SearchIndex as SearchIndex
+    import Utils.TakeQuery as TakeQuery
+    import Utils.TaskScheduler as TaskScheduler
 else:
     from .Utils import WindowCreator
+    from .Utils import NameValidation
+    from .Utils import SearchIndex
+    from .Utils import TakeQuery
+    from .Utils import TaskScheduler
 
 # Reload this script if the imported script has been edited.
 reload(WindowCreator)
+reload(NameValidation)
+reload(SearchIndex)
+reload(TakeQuery)
+reload(TaskScheduler)
 
 # Define application if it has not already been defined.
 if not globals().get("Application"):
@@ -48,8 +65,18 @@ TOOL_NAME = "[JC] Take Manager"
 # Define custom property name of parent.
 PROPERTY_NAME_TAKE_UUID = "Take UUID"
 
-# Set max allowed length of characters in text.
-MAX_PACKAGE_LENGTH = 160
+# Define name of the note that stores metadata of all takes in scene, and the custom property holding it.
+METADATA_NOTE_NAME = "TakeManager Metadata"
+PROPERTY_NAME_METADATA = "Take Metadata"
+
+# Define name of the scene setting holding which engine's naming rules takes are validated against.
+SETTING_NAME_RULE_PRESET = "Name Rule Preset"
+
+# Set to True to verify the take to item index against the tree widget after every change. Slow, only use when debugging.
+DEBUG_VALIDATE_ITEM_INDEX = False
+
+# Set to True to print lookup statistics of the tool in the Python console.
+DEBUG_REPORT_STATS = False
 
 
 
@@ -85,25 +112,595 @@ def FindParentWidgetByType(Widget, Type):
 
 
 
-def GetUniqueIdByTake(Take: FBTake) -> str:
+class TakeUniqueIdRegistry():
+    """ Index of takes by their unique ID. Built once per scene load and kept up to date incrementally. """
+
+
+    def __init__(self):
+        self.TakesByUniqueId: dict[str, FBTake] = {}
+        self.UniqueIdsByTake: dict[FBTake, str] = {}
+
+
+    def Rebuild(self):
+        """ Index every take in scene that owns an ID. """
+        self.TakesByUniqueId.clear()
+        self.UniqueIdsByTake.clear()
+        self.ResolveDuplicates(System.Scene.Takes)
+
+
+    def Register(self, Take: FBTake):
+        """ Index take if it owns an ID. Takes without an ID are left untouched. """
+        self.ResolveDuplicates([Take])
+
+
+    def ResolveDuplicates(self, Takes: list[FBTake]):
+        """
+        Index takes in one pass and give a new ID to any take whose ID is already owned by another take.
+        CopyTake and file merge both bring in takes that share an ID with an existing take.
+        Args:
+            Takes - Takes in scene order. Children are expected to come after their group, which is the order the tool keeps natively.
+        """
+        # Map of an ID that has been reissued to the new ID of the take that most recently owned it.
+        ReissuedIds: dict[str, str] = {}
+        for Take in Takes:
+            UUIDProperty = Take.PropertyList.Find(PROPERTY_NAME_TAKE_UUID, False)
+            if not UUIDProperty:
+                # Takes without an ID only need one if metadata was migrated from their legacy properties.
+                if not MetadataStore.HasLegacyRecord(Take):
+                    continue
+                UUID = self.GetUniqueId(Take)
+            else:
+                UUID = UUIDProperty.Data
+                Owner = self.GetTake(UUID)
+                if Owner is not None and Owner is not Take:
+                    NewUUID = str(uuid.uuid4())
+                    UUIDProperty.Data = NewUUID
+                    ReissuedIds[UUID] = NewUUID
+                    # Merged takes get the record they came with, copies start out with the record of the take they were copied from.
+                    MetadataStore.ReissueRecord(UUID, NewUUID)
+                    UUID = NewUUID
+                else:
+                    # Children listed after the original owner belong to the original again.
+                    ReissuedIds.pop(UUID, None)
+                self.Add(Take, UUID)
+            # Metadata migrated from legacy properties belongs to this take, whatever ID it ended up with.
+            MetadataStore.AdoptLegacyRecord(Take, UUID)
+            # Children listed after a reissued group belong to that group, so follow the new ID.
+            if ReissuedIds:
+                MetadataStore.RewriteParent(UUID, ReissuedIds)
+
+
+    def Add(self, Take: FBTake, UUID: str):
+        """ Index take by the given ID. """
+        self.Unregister(Take)
+        self.TakesByUniqueId[UUID] = Take
+        self.UniqueIdsByTake[Take] = UUID
+
+
+    def Unregister(self, Take: FBTake):
+        """ Remove take from index. """
+        UUID = self.UniqueIdsByTake.pop(Take, None)
+        if UUID is not None and self.TakesByUniqueId.get(UUID) is Take:
+            del self.TakesByUniqueId[UUID]
+
+
+    def GetTake(self, UUID: str) -> FBTake:
+        """ Get take by ID. Takes that have been deleted since they were indexed are dropped. """
+        Take = self.TakesByUniqueId.get(UUID)
+        if Take is not None and not IsBound(Take):
+            self.Unregister(Take)
+            return None
+        return Take
+
+
+    def GetUniqueId(self, Take: FBTake, bCreate = True) -> str:
+        """ Get ID of take. Only create a new one if asked for, so reading IDs never changes the scene. """
+        UUID = self.UniqueIdsByTake.get(Take)
+        if UUID is not None or not bCreate:
+            return UUID
+        # Reading or creating the ID property of a deleted take crashes.
+        if not IsBound(Take):
+            raise RuntimeError("A deleted take can't be given an ID!")
+        UUIDProperty = Take.PropertyList.Find(PROPERTY_NAME_TAKE_UUID, False)
+        # If no ID is found, create a new one.
+        if UUIDProperty is None:
+            UUIDProperty: FBPropertyListObject = Take.PropertyCreate(PROPERTY_NAME_TAKE_UUID, FBPropertyType.kFBPT_charptr, "", False, True, None)
+            UUIDProperty.Data = str(uuid.uuid4())
+        self.Add(Take, UUIDProperty.Data)
+        return UUIDProperty.Data
+
+
+# Registry shared by the whole tool, there is only ever one scene loaded.
+UniqueIdRegistry = TakeUniqueIdRegistry()
+
+
+def GetUniqueIdByTake(Take: FBTake, bCreate = True) -> str:
     """ Get the unique ID that the take owns. """
-    UUIDProperty = Take.PropertyList.Find(PROPERTY_NAME_TAKE_UUID, False)
-    # If no ID is found, create a new one.
-    if UUIDProperty is None:
-        UUIDProperty: FBPropertyListObject = Take.PropertyCreate(PROPERTY_NAME_TAKE_UUID, FBPropertyType.kFBPT_charptr, "", False, True, None)
-        UUIDProperty.Data = str(uuid.uuid4())
-    return UUIDProperty.Data
+    return UniqueIdRegistry.GetUniqueId(Take, bCreate)
 
 
 def GetTakeByUniqueID(UUID: str) -> FBTake:
     """ Get take by their unique ID. """
-    # Go through every takes in scene and check if they own an ID.
-    for Take in System.Scene.Takes:
-        UUIDProperty = Take.PropertyList.Find(PROPERTY_NAME_TAKE_UUID, False)
-        # return takes that have matching data with UUID.
-        if UUIDProperty:
-            if UUIDProperty.Data == UUID:
-                return Take
+    return UniqueIdRegistry.GetTake(UUID)
+
+
+
+# ----------------- TAKES METADATA ----------------- #
+
+
+
+class TakeMetadataStore():
+    """
+    Group, expanded, color and search match state of every take in scene, keyed by take ID.
+    Kept in memory and saved as a single serialized blob on a note in scene, instead of custom properties on every take.
+    """
+
+
+    # Increase if the layout of the saved blob changes.
+    METADATA_VERSION = 1
+
+
+    def __init__(self):
+        self.Records: dict[str, dict] = {}
+        # Settings of the tool that belong to the scene rather than to a take.
+        self.Settings: dict = {}
+        self.bIsLoaded = False
+        self.bIsDirty = False
+        self.bMigrationPending = False
+        # Note the scene's own metadata was read from, metadata in memory is newer than what it holds.
+        self.OwnNote: FBNote = None
+        # Records read from merged notes and legacy properties, kept until take IDs have been resolved.
+        self.ClearIncomingRecords()
+        # Number of values that have been set or removed, reported in debug stats.
+        self.WriteCount = 0
+
+
+    def Clear(self):
+        """ Forget all metadata. Called when a new scene is about to be opened. """
+        self.Records = {}
+        self.Settings = {}
+        self.bIsLoaded = False
+        self.bIsDirty = False
+        self.bMigrationPending = False
+        self.OwnNote = None
+        self.ClearIncomingRecords()
+
+
+    def ClearIncomingRecords(self):
+        """ Forget records that no take claimed once take IDs have been resolved. """
+        # Records of merged notes whose ID was already taken, per ID in the order their notes were read.
+        self.IncomingRecords: dict[str, list[dict]] = {}
+        # Records migrated from legacy properties, per take.
+        self.LegacyRecordsByTake: dict[FBTake, dict] = {}
+        # True while takes that were just merged or migrated are given their IDs, their duplicates don't copy the record of the take they share an ID with.
+        self.bIsResolvingIncoming = False
+
+
+    def FindNotes(self) -> list[FBNote]:
+        """ Find all metadata notes in scene. A merge can bring in more than one. """
+        return [Note for Note in System.Scene.Notes if Note.Name.startswith(METADATA_NOTE_NAME)]
+
+
+    def Load(self):
+        """
+        Read metadata from scene with a single property read per note. Metadata already in memory wins over what its own note holds.
+        Records of merged notes that share an ID with a take in scene are kept aside, and given to the merged take once it has been given a new ID.
+        """
+        if self.bIsLoaded:
+            return
+        Notes = self.FindNotes()
+        # A freshly opened scene owns its first note, a merge keeps the note that was already owned.
+        if self.OwnNote is not None and not IsBound(self.OwnNote):
+            self.OwnNote = None
+        if self.OwnNote is None and not self.Records and Notes:
+            self.OwnNote = Notes[0]
+        # Records of takes that no longer exist would take the place of merged records with the same ID.
+        if self.Records:
+            for UUID in [UUID for UUID in self.Records if GetTakeByUniqueID(UUID) is None]:
+                del self.Records[UUID]
+                self.bIsDirty = True
+        for Note in Notes:
+            bIsOwnNote = Note == self.OwnNote
+            if not bIsOwnNote:
+                self.bIsResolvingIncoming = True
+            MetadataProperty = Note.PropertyList.Find(PROPERTY_NAME_METADATA, False)
+            if not MetadataProperty or not MetadataProperty.Data:
+                continue
+            try:
+                Metadata = json.loads(MetadataProperty.Data)
+            except ValueError:
+                continue
+            for UUID, Record in Metadata.get("Takes", {}).items():
+                # Search matches used to be stored with the take, they only belong to the view.
+                if Record.pop(TakeTreeItem.PROPERTY_NAME_SEARCH_MATCH_COLOR, None) is not None:
+                    self.bIsDirty = True
+                    if not Record:
+                        continue
+                # Merged takes whose ID is already owned by a take in scene are given a new ID, their record waits for it.
+                bIsOwnedInScene = UUID in self.Records or (not bIsOwnNote and GetTakeByUniqueID(UUID) is not None)
+                if not bIsOwnedInScene:
+                    self.Records[UUID] = Record
+                elif not bIsOwnNote:
+                    self.IncomingRecords.setdefault(UUID, []).append(Record)
+                    self.bIsDirty = True
+            for Key, Value in Metadata.get("Settings", {}).items():
+                self.Settings.setdefault(Key, Value)
+        # Merged notes are folded into the own one on next save.
+        for Note in Notes:
+            if Note != self.OwnNote:
+                Note.FBDelete()
+                self.bIsDirty = True
+        # Scenes saved before metadata was stored on a note still keep it on every take.
+        if not Notes:
+            self.bMigrationPending = True
+            self.bIsDirty = True
+        self.bIsLoaded = True
+
+
+    def MigrateLegacyProperties(self):
+        """
+        Move metadata from custom properties on every take into the store, and remove those properties.
+        Has to run before take IDs are resolved. Records are kept per take until then, as a merged take may still be given a new ID.
+        """
+        if not self.bMigrationPending:
+            return
+        self.bMigrationPending = False
+        self.bIsResolvingIncoming = True
+        LegacyPropertyNames = (
+            TakeTreeItem.PROPERTY_NAME_GROUP,
+            TakeTreeItem.PROPERTY_NAME_EXPANDED,
+            TakeTreeItem.PROPERTY_NAME_COLOR,
+            TakeTreeItem.PROPERTY_NAME_SEARCH_MATCH_COLOR,
+        )
+        for Take in System.Scene.Takes:
+            for PropertyName in LegacyPropertyNames:
+                LegacyProperty = Take.PropertyList.Find(PropertyName, False)
+                if not LegacyProperty:
+                    continue
+                Value = LegacyProperty.Data
+                # Colors were saved as 0-1 FBColor, the store keeps 0-255 like the rest of the tool.
+                if PropertyName == TakeTreeItem.PROPERTY_NAME_COLOR:
+                    self.LegacyRecordsByTake.setdefault(Take, {})[PropertyName] = [round(Value[0] * 255), round(Value[1] * 255), round(Value[2] * 255)]
+                elif PropertyName == TakeTreeItem.PROPERTY_NAME_EXPANDED:
+                    self.LegacyRecordsByTake.setdefault(Take, {})[PropertyName] = bool(Value)
+                elif PropertyName == TakeTreeItem.PROPERTY_NAME_GROUP:
+                    self.LegacyRecordsByTake.setdefault(Take, {})[PropertyName] = Value
+                # Search matches are redone by the next search, so they are only removed.
+                Take.PropertyRemove(LegacyProperty)
+
+
+    def Save(self):
+        """ Write metadata to scene as a single property, if anything has changed. """
+        if not self.bIsDirty:
+            return
+        # Drop records of takes that no longer exist so the saved blob doesn't keep growing.
+        for UUID in [UUID for UUID in self.Records if GetTakeByUniqueID(UUID) is None]:
+            del self.Records[UUID]
+        Note = self.OwnNote if self.OwnNote is not None and IsBound(self.OwnNote) else None
+        if Note is None:
+            Notes = self.FindNotes()
+            Note = Notes[0] if Notes else FBNote(METADATA_NOTE_NAME)
+            self.OwnNote = Note
+        MetadataProperty = Note.PropertyList.Find(PROPERTY_NAME_METADATA, False)
+        if MetadataProperty is None:
+            MetadataProperty: FBPropertyListObject = Note.PropertyCreate(PROPERTY_NAME_METADATA, FBPropertyType.kFBPT_charptr, "", False, True, None)
+        Metadata = {"Version": self.METADATA_VERSION, "Takes": self.Records, "Settings": self.Settings}
+        MetadataProperty.Data = json.dumps(Metadata, separators = (",", ":"))
+        self.bIsDirty = False
+
+
+    def GetSetting(self, Key: str, Default = None):
+        """ Get setting of the tool saved with the scene. """
+        return self.Settings.get(Key, Default)
+
+
+    def SetSetting(self, Key: str, Value):
+        """ Set setting of the tool saved with the scene. """
+        if self.Settings.get(Key) != Value:
+            self.Settings[Key] = Value
+            self.bIsDirty = True
+
+
+    def GetRecord(self, Take: FBTake, bCreate = False) -> dict:
+        """ Get metadata record of take. Only gives the take an ID and a record if asked for. """
+        UUID = GetUniqueIdByTake(Take, bCreate)
+        if UUID is None:
+            return None
+        Record = self.Records.get(UUID)
+        if Record is None and bCreate:
+            Record = self.Records[UUID] = {}
+        return Record
+
+
+    def GetValue(self, Take: FBTake, Key: str, Default = None):
+        """ Get metadata value of take. Never creates an ID. """
+        Record = self.GetRecord(Take)
+        if not Record:
+            return Default
+        return Record.get(Key, Default)
+
+
+    def SetValue(self, Take: FBTake, Key: str, Value):
+        """ Set metadata value of take. Gives the take an ID if it doesn't own one yet. """
+        Record = self.GetRecord(Take, bCreate = True)
+        if Record.get(Key) != Value:
+            Record[Key] = Value
+            self.bIsDirty = True
+            self.WriteCount += 1
+
+
+    def RemoveValue(self, Take: FBTake, Key: str):
+        """ Remove metadata value of take. """
+        Record = self.GetRecord(Take)
+        if not Record or Key not in Record:
+            return
+        del Record[Key]
+        self.WriteCount += 1
+        # Drop empty records so the take doesn't keep an entry in the saved blob.
+        if not Record:
+            del self.Records[GetUniqueIdByTake(Take, bCreate = False)]
+        self.bIsDirty = True
+
+
+    def ReissueRecord(self, OldUUID: str, NewUUID: str):
+        """ Give a take that was given a new ID its record. A merged take gets the record its note held for the old ID, a copy gets the record of the take it was copied from. """
+        Queue = self.IncomingRecords.get(OldUUID)
+        if Queue:
+            self.Records[NewUUID] = Queue.pop(0)
+            self.bIsDirty = True
+        elif not self.bIsResolvingIncoming:
+            self.CopyRecord(OldUUID, NewUUID)
+
+
+    def HasLegacyRecord(self, Take: FBTake) -> bool:
+        """ Check if metadata was migrated from legacy properties of take, and is waiting for its ID. """
+        return Take in self.LegacyRecordsByTake
+
+
+    def AdoptLegacyRecord(self, Take: FBTake, UUID: str):
+        """ Store metadata migrated from legacy properties of take under the ID it ended up with. Its properties win over any record read for that ID. """
+        LegacyRecord = self.LegacyRecordsByTake.pop(Take, None)
+        if not LegacyRecord:
+            return
+        self.Records.setdefault(UUID, {}).update(LegacyRecord)
+        self.bIsDirty = True
+        self.WriteCount += len(LegacyRecord)
+
+
+    def CopyRecord(self, FromUUID: str, ToUUID: str):
+        """ Give a take the same metadata as another take. """
+        Record = self.Records.get(FromUUID)
+        if Record is not None:
+            self.Records[ToUUID] = dict(Record)
+            self.bIsDirty = True
+
+
+    def RewriteParent(self, UUID: str, ReissuedIds: dict[str, str]):
+        """ Point parent of take at the new ID, if its parent has been given a new ID. """
+        Record = self.Records.get(UUID)
+        if not Record:
+            return
+        ParentUUID = Record.get(TakeTreeItem.PROPERTY_NAME_GROUP)
+        if ParentUUID in ReissuedIds:
+            Record[TakeTreeItem.PROPERTY_NAME_GROUP] = ReissuedIds[ParentUUID]
+            self.bIsDirty = True
+
+
+# Store shared by the whole tool, there is only ever one scene loaded.
+MetadataStore = TakeMetadataStore()
+
+
+
+# ----------------- TAKES HIERARCHY ----------------- #
+
+
+
+class TakeHierarchy():
+    """ Index of the group structure of takes. Answers parent, children, depth and subtree queries without walking the tree widget. """
+
+
+    def __init__(self):
+        self.ParentByTake: dict[FBTake, FBTake] = {}
+        # Children are kept in insertion order, which is scene order when built.
+        self.ChildrenByTake: dict[FBTake, dict[FBTake, None]] = {}
+        self.DepthByTake: dict[FBTake, int] = {}
+        # Takes whose parent link had to be removed on last build.
+        self.RepairedTakes: list[FBTake] = []
+
+
+    def Clear(self):
+        """ Forget all takes. """
+        self.ParentByTake.clear()
+        self.ChildrenByTake.clear()
+        self.DepthByTake.clear()
+        self.RepairedTakes = []
+
+
+    def Build(self, Takes: list[FBTake]):
+        """
+        Build the index in one linear pass from the parent links in metadata.
+        Links to deleted takes, takes parented to themselves and cycles are repaired by moving the take to root.
+        """
+        self.Clear()
+        Takes = list(Takes)
+        TakesInScene = set(Takes)
+        # Resolve parent links.
+        for Take in Takes:
+            ParentUUID = MetadataStore.GetValue(Take, TakeTreeItem.PROPERTY_NAME_GROUP)
+            if not ParentUUID:
+                continue
+            Parent = GetTakeByUniqueID(ParentUUID)
+            if Parent is None or Parent is Take or Parent not in TakesInScene:
+                self.RepairLink(Take)
+                continue
+            self.ParentByTake[Take] = Parent
+        # Walk up from every take, each take is only visited once. Meeting a take that is on the current path again means there is a cycle.
+        VISITING, VISITED = 1, 2
+        States: dict[FBTake, int] = {}
+        for Take in Takes:
+            Path = []
+            Current = Take
+            while Current is not None and Current not in States:
+                States[Current] = VISITING
+                Path.append(Current)
+                Current = self.ParentByTake.get(Current)
+            if Current is not None and States[Current] == VISITING:
+                # Break the cycle where it closed.
+                del self.ParentByTake[Current]
+                self.RepairLink(Current)
+            for PathTake in Path:
+                States[PathTake] = VISITED
+        # Children in scene order.
+        for Take in Takes:
+            Parent = self.ParentByTake.get(Take)
+            if Parent is not None:
+                self.ChildrenByTake.setdefault(Parent, {})[Take] = None
+
+
+    def RepairLink(self, Take: FBTake):
+        """ Remove broken parent link of take. """
+        MetadataStore.RemoveValue(Take, TakeTreeItem.PROPERTY_NAME_GROUP)
+        self.RepairedTakes.append(Take)
+
+
+    def GetParent(self, Take: FBTake) -> FBTake:
+        """ Get parent of take, None if take is at root. """
+        return self.ParentByTake.get(Take)
+
+
+    def GetChildren(self, Take: FBTake) -> list[FBTake]:
+        """ Get direct children of take. """
+        return list(self.ChildrenByTake.get(Take, ()))
+
+
+    def HasChildren(self, Take: FBTake) -> bool:
+        """ Check if take has any children. """
+        return bool(self.ChildrenByTake.get(Take))
+
+
+    def GetDescendants(self, Take: FBTake) -> list[FBTake]:
+        """ Get all children of take recursively, depth first. """
+        Descendants = []
+        Stack = list(reversed(self.GetChildren(Take)))
+        while Stack:
+            Current = Stack.pop()
+            Descendants.append(Current)
+            Stack.extend(reversed(self.GetChildren(Current)))
+        return Descendants
+
+
+    def GetDepth(self, Take: FBTake) -> int:
+        """ Get number of ancestors of take. """
+        Depth = self.DepthByTake.get(Take)
+        if Depth is not None:
+            return Depth
+        # Walk up to the first ancestor with a known depth and fill in the path on the way back.
+        Path = []
+        Current = Take
+        while Current is not None and Current not in self.DepthByTake:
+            Path.append(Current)
+            Current = self.ParentByTake.get(Current)
+        Depth = -1 if Current is None else self.DepthByTake[Current]
+        for PathTake in reversed(Path):
+            Depth += 1
+            self.DepthByTake[PathTake] = Depth
+        return self.DepthByTake[Take]
+
+
+    def IsAncestor(self, Ancestor: FBTake, Take: FBTake) -> bool:
+        """ Check if a take is the parent of another take, at any depth. """
+        Current = self.ParentByTake.get(Take)
+        while Current is not None:
+            if Current is Ancestor:
+                return True
+            Current = self.ParentByTake.get(Current)
+        return False
+
+
+    def SetParent(self, Take: FBTake, Parent: FBTake = None):
+        """ Move take to a new parent, or to root if parent is None. """
+        if Parent is Take or (Parent is not None and self.IsAncestor(Take, Parent)):
+            raise RuntimeError("Take can't be parented to itself or to one of its children!")
+        OldParent = self.ParentByTake.pop(Take, None)
+        if OldParent is not None:
+            self.ChildrenByTake[OldParent].pop(Take, None)
+        if Parent is not None:
+            self.ParentByTake[Take] = Parent
+            self.ChildrenByTake.setdefault(Parent, {})[Take] = None
+        # Depth of the whole subtree has changed.
+        self.DepthByTake.pop(Take, None)
+        for Descendant in self.GetDescendants(Take):
+            self.DepthByTake.pop(Descendant, None)
+
+
+    def Remove(self, Take: FBTake):
+        """ Remove take from index. Its children are moved to its parent. """
+        Parent = self.ParentByTake.get(Take)
+        for Child in self.GetChildren(Take):
+            self.SetParent(Child, Parent)
+        self.SetParent(Take, None)
+        self.ChildrenByTake.pop(Take, None)
+        self.DepthByTake.pop(Take, None)
+
+
+
+# ----------------- SEARCH QUERY TABLE ----------------- #
+
+
+
+class SceneTakeTable():
+    """ Values of takes that search queries are tested against. Read from the indexes the tool already keeps, only frames are read from scene once per take. """
+
+
+    def __init__(self, Widget: MainWidget):
+        self.Widget = Widget
+        self.FramesByTake: dict[FBTake, int] = {}
+
+
+    def Clear(self):
+        """ Forget all cached frames. """
+        self.FramesByTake = {}
+
+
+    def Forget(self, Take: FBTake):
+        """ Forget cached frames of take, so they are read again next time. """
+        self.FramesByTake.pop(Take, None)
+
+
+    def GetName(self, Take: FBTake) -> str:
+        """ Get lowercase name of take. """
+        return self.Widget.NameIndex.NormalizedNamesByKey.get(Take, "")
+
+
+    def GetColorName(self, Take: FBTake) -> str:
+        """ Get lowercase name of the color of take, "none" if it has no color. """
+        Color = MetadataStore.GetValue(Take, TakeTreeItem.PROPERTY_NAME_COLOR)
+        if not Color:
+            return "none"
+        return self.Widget.COLOR_NAMES.get(tuple(Color), "custom")
+
+
+    def GetGroupNames(self, Take: FBTake) -> list[str]:
+        """ Get lowercase names of every group take is inside of, closest first. """
+        GroupNames = []
+        ParentTake = self.Widget.Hierarchy.GetParent(Take)
+        while ParentTake is not None:
+            GroupNames.append(self.GetName(ParentTake))
+            ParentTake = self.Widget.Hierarchy.GetParent(ParentTake)
+        return GroupNames
+
+
+    def IsInvalid(self, Take: FBTake) -> bool:
+        """ Check if name of take has any warnings. """
+        return Take in self.Widget.WarningsByTake
+
+
+    def GetFrames(self, Take: FBTake) -> int:
+        """ Get number of frames in take, read from scene only the first time. """
+        Frames = self.FramesByTake.get(Take)
+        if Frames is None:
+            Frames = self.FramesByTake[Take] = Take.LocalTimeSpan.GetDuration().GetFrame()
+        return Frames
 
 
 
@@ -124,22 +721,72 @@ def IsBound(Object: FBComponent):
 
 
 def ApplyTakeOrder(TakeList: list[FBTake], bKeepCurrentTake = True):
-    """ Sort take order by piping in a new list with the expected order. """
+    """ Sort take order by piping in a new list with the expected order. Only the takes that are out of order are moved. Returns False if the order was already right. """
     if len(TakeList) != len(System.Scene.Takes):
         raise ValueError("Length of the given sorted takes list does not match the scene takes!")
-    
+    CurrentTakeList = list(System.Scene.Takes)
+    if CurrentTakeList == TakeList:
+        return False
+
     CurrentTake = System.CurrentTake
 
-    # Disconnect all of the takes from the scene.
-    for Take in TakeList[1:]:
-        Take.DisconnectDst(System.Scene)
-    # Populate the take list with the takes in the specified order.
-    for Take in TakeList[1:]:
-        System.Scene.ConnectSrc(Take, FBConnectionType.kFBConnectionTypeSystem)
+    # Takes on the longest run that is already in order stay where they are.
+    TargetIndices = {Take: Index for Index, Take in enumerate(TakeList)}
+    StableTakes = {CurrentTakeList[Index] for Index in GetLongestIncreasingSubsequence([TargetIndices[Take] for Take in CurrentTakeList])}
+    MovedTakes = [Take for Take in TakeList if Take not in StableTakes]
+    try:
+        # Go backwards, so the take each moved take has to be placed in front of is always in place already.
+        NextTake = None
+        for Take in reversed(TakeList):
+            if Take not in StableTakes:
+                # Reconnecting puts take last, from where it is moved in front of the next take.
+                Take.DisconnectDst(System.Scene)
+                System.Scene.ConnectSrc(Take, FBConnectionType.kFBConnectionTypeSystem)
+                if NextTake is not None:
+                    System.Scene.MoveSrcAt(Take, NextTake)
+            NextTake = Take
+        bIsSorted = list(System.Scene.Takes) == TakeList
+    except (AttributeError, TypeError):
+        bIsSorted = False
+    # Reconnect every take in order if moving single takes didn't give the expected order.
+    if not bIsSorted:
+        for Take in TakeList[1:]:
+            Take.DisconnectDst(System.Scene)
+        for Take in TakeList[1:]:
+            System.Scene.ConnectSrc(Take, FBConnectionType.kFBConnectionTypeSystem)
+    if DEBUG_REPORT_STATS:
+        print(f"{TOOL_NAME}: Take order applied by moving {len(MovedTakes) if bIsSorted else len(TakeList) - 1} of {len(TakeList)} takes.")
 
     # Set current active take again once reordering has finished.
     if bKeepCurrentTake:
         System.CurrentTake = CurrentTake
+    return True
+
+
+def GetLongestIncreasingSubsequence(Values: list[int]) -> list[int]:
+    """ Get indices of the longest strictly increasing subsequence of values, in O(n log n). """
+    # Smallest tail value of an increasing subsequence of each length, and the index it came from.
+    TailValues: list[int] = []
+    TailIndices: list[int] = []
+    PreviousIndices: list[int] = [-1] * len(Values)
+    for Index, Value in enumerate(Values):
+        Length = bisect.bisect_left(TailValues, Value)
+        if Length > 0:
+            PreviousIndices[Index] = TailIndices[Length - 1]
+        if Length == len(TailValues):
+            TailValues.append(Value)
+            TailIndices.append(Index)
+        else:
+            TailValues[Length] = Value
+            TailIndices[Length] = Index
+    # Walk back from the end of the longest subsequence.
+    Subsequence = []
+    Index = TailIndices[-1] if TailIndices else -1
+    while Index != -1:
+        Subsequence.append(Index)
+        Index = PreviousIndices[Index]
+    Subsequence.reverse()
+    return Subsequence
 
 
 def GetMoBuSelection() -> list[FBComponent]:
@@ -172,14 +819,28 @@ class TakeTreeItem(QtWidgets.QTreeWidgetItem):
     PROPERTY_NAME_GROUP = "Parent UUID"
     PROPERTY_NAME_EXPANDED = "Expanded"
     PROPERTY_NAME_COLOR = "Color"
+    # Only used to remove search matches saved by older versions, matches are never written to the scene.
     PROPERTY_NAME_SEARCH_MATCH_COLOR = "Search Match Color"
 
+    # Set background color of the active take.
+    ACTIVE_TAKE_BACKGROUND_COLOR = (60,60,65)
+
+    # Font of the active take. Created on first use, as fonts can't be created before the application exists.
+    ActiveTakeFont: QtGui.QFont = None
+
 
     def __init__(self, Take: FBTake):
         super().__init__()
 
         # Define take.
         self.Take = Take
+        # Background color of the active take, and whether take is the active one.
+        self.BackgroundColor: QtGui.QColor = None
+        self.bIsActiveTake = False
+        # Background color while take matches your search. Only kept by the view, drawn over the active take background.
+        self.SearchMatchColor: QtGui.QColor = None
+        # False while the items of children in a collapsed group haven't been created yet.
+        self.bChildrenMaterialized = True
         # Match item name with take name.
         self.setText(0, self.Take.Name)
         # Make item editable.
@@ -188,28 +849,40 @@ class TakeTreeItem(QtWidgets.QTreeWidgetItem):
         Color = self.GetColor()
         if Color:
             self.SetColor(Color)
-        self.ResetSearchMatchBackgroundColor()
 
 
-    def SelectActiveTake(self, bUpdateGuiOnly = False, bIsMatchedSearch = False):
+    def UpdateBackgroundRole(self):
+        """ Store background of item in its data, search match drawn over the active take background. Roles are only set when they change, so painting never calls into Python. """
+        self.setData(0, QtCore.Qt.BackgroundRole, self.SearchMatchColor if self.SearchMatchColor is not None else self.BackgroundColor)
+
+
+    @classmethod
+    def GetActiveTakeFont(cls) -> QtGui.QFont:
+        """ Get font of the active take, shared by all items. """
+        if cls.ActiveTakeFont is None:
+            FontStyle = QtGui.QFont()
+            FontStyle.setBold(True)
+            FontStyle.setWeight(100)
+            cls.ActiveTakeFont = FontStyle
+        return cls.ActiveTakeFont
+
+
+    def SelectActiveTake(self, bUpdateGuiOnly = False):
         """ Customize the active take in list. Set current take in MoBu. """
-        FontStyle = QtGui.QFont()
-        FontStyle.setBold(True)
-        FontStyle.setWeight(100)
-        self.setFont(0, FontStyle)
-        if not bIsMatchedSearch:
-            self.setBackgroundColor(0, QtGui.QColor(60,60,65))
+        self.bIsActiveTake = True
+        self.BackgroundColor = QtGui.QColor(*self.ACTIVE_TAKE_BACKGROUND_COLOR)
+        self.setData(0, QtCore.Qt.FontRole, self.GetActiveTakeFont())
+        self.UpdateBackgroundRole()
         if not bUpdateGuiOnly:
             System.CurrentTake = self.Take
 
 
-    def DeselectActiveTake(self, bIsMatchedSearch = False):
+    def DeselectActiveTake(self):
         """ Reset bold and background color on previous active item in list. """
+        self.bIsActiveTake = False
+        self.BackgroundColor = None
         self.setData(0, QtCore.Qt.FontRole, None)
-        if not bIsMatchedSearch:
-            self.setData(0, QtCore.Qt.BackgroundRole, None)
-        else:
-            pass
+        self.UpdateBackgroundRole()
 
 
     def DeleteTake(self):
@@ -219,99 +892,89 @@ class TakeTreeItem(QtWidgets.QTreeWidgetItem):
             self.Take.FBDelete() 
 
 
+    def GetMetadata(self, Key: str, Default = None):
+        """ Get metadata value of take. """
+        return MetadataStore.GetValue(self.Take, Key, Default)
+
+
+    def SetMetadata(self, Key: str, Value):
+        """ Set metadata value of take. """
+        MetadataStore.SetValue(self.Take, Key, Value)
+
+
+    def RemoveMetadata(self, Key: str):
+        """ Remove metadata value of take. """
+        MetadataStore.RemoveValue(self.Take, Key)
+
+
     def GetParentTake(self) -> FBTake:
         """ Get parent of selected item. """
-        GroupProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_GROUP, False)
-        if not GroupProperty:
+        ParentUUID = self.GetMetadata(self.PROPERTY_NAME_GROUP)
+        if not ParentUUID:
             return None
-        return GetTakeByUniqueID(GroupProperty.Data)
+        return GetTakeByUniqueID(ParentUUID)
 
 
     def SetParentProperty(self, Parent: TakeTreeItem):
         """ Set parent property of selected item. """
-        GroupProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_GROUP, False)
-        if GroupProperty is None:
-            GroupProperty: FBPropertyListObject = self.Take.PropertyCreate(self.PROPERTY_NAME_GROUP, FBPropertyType.kFBPT_charptr, "", False, True, None)
-        GroupProperty.Data = GetUniqueIdByTake(Parent.Take)
+        self.SetMetadata(self.PROPERTY_NAME_GROUP, GetUniqueIdByTake(Parent.Take))
 
 
     def RemoveParentProperty(self):
         """ Remove parent property of selected item. """
-        GroupProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_GROUP, False)
-        if GroupProperty:
-            self.Take.PropertyRemove(GroupProperty)
+        self.RemoveMetadata(self.PROPERTY_NAME_GROUP)
 
 
     def SetItemExpanded(self, bIsExpanded):
         """ Set expanded property on item. """
-        ExpandedProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_EXPANDED, False)
-        if not ExpandedProperty:
-            ExpandedProperty = self.Take.PropertyCreate(self.PROPERTY_NAME_EXPANDED, FBPropertyType.kFBPT_bool, "", False, True, None)
-        ExpandedProperty.Data = bIsExpanded
+        self.SetMetadata(self.PROPERTY_NAME_EXPANDED, bool(bIsExpanded))
 
 
     def GetItemExpanded(self):
         """ Get if item is expanded or not. """
-        ExpandedProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_EXPANDED, False)
-        if not ExpandedProperty:
-            return False
-        return ExpandedProperty.Data
+        return self.GetMetadata(self.PROPERTY_NAME_EXPANDED, False)
         
 
     def SetColor(self, Color):
         """ Set color of item. """
         # Colors.
-        ColorVariable = QtGui.QColor(*Color)
-        self.setForeground(0, ColorVariable)
-        # Custom property.
-        ColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_COLOR, False)
-        if not ColorProperty:
-            ColorProperty = self.Take.PropertyCreate(self.PROPERTY_NAME_COLOR, FBPropertyType.kFBPT_ColorRGB, "", False, True, None)
-        ColorProperty.Data = FBColor(Color[0] / 255, Color[1] / 255, Color[2] / 255)
+        self.setData(0, QtCore.Qt.ForegroundRole, QtGui.QColor(*Color))
+        # Metadata.
+        self.SetMetadata(self.PROPERTY_NAME_COLOR, [round(Color[0]), round(Color[1]), round(Color[2])])
 
 
     def GetColor(self):
         """ Get color of item. """
-        ColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_COLOR, False)
-        if not ColorProperty:
+        Color = self.GetMetadata(self.PROPERTY_NAME_COLOR)
+        if not Color:
             return None
-        return ColorProperty.Data[0] * 255, ColorProperty.Data[1] * 255, ColorProperty.Data[2] * 255
+        return tuple(Color)
 
 
     def ResetColor(self):
         """ Reset color of item. """
         # Colors.
         self.setData(0, QtCore.Qt.ForegroundRole, None)
-        # Custom property.
-        ColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_COLOR, False)
-        if ColorProperty:
-            self.Take.PropertyRemove(ColorProperty)
+        # Metadata.
+        self.RemoveMetadata(self.PROPERTY_NAME_COLOR)
 
 
     def SetSearchMatchBackgroundColor(self, Color):
-        """ Set color of item that matches your search. """
-        ColorVariable = QtGui.QColor(*Color)
-        self.setBackgroundColor(0, ColorVariable)
-        # Custom property.
-        SearchMatchColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_SEARCH_MATCH_COLOR, False)
-        if not SearchMatchColorProperty:
-            SearchMatchColorProperty = self.Take.PropertyCreate(self.PROPERTY_NAME_SEARCH_MATCH_COLOR, FBPropertyType.kFBPT_ColorRGB, "", False, True, None)
-        SearchMatchColorProperty.Data = FBColor(Color[0] / 255, Color[1] / 255, Color[2] / 255)
+        """ Set color of item that matches your search. Only changes the view, nothing is written to the take. """
+        self.SearchMatchColor = QtGui.QColor(*Color)
+        self.UpdateBackgroundRole()
 
 
     def ResetSearchMatchBackgroundColor(self):
         """ Reset color of item that matches your search. """
-        self.setBackgroundColor(0, QtCore.Qt.transparent)
-        SearchMatchColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_SEARCH_MATCH_COLOR, False)
-        if SearchMatchColorProperty:
-            self.Take.PropertyRemove(SearchMatchColorProperty)
+        self.SearchMatchColor = None
+        self.UpdateBackgroundRole()
 
 
     def HasSearchMatchBackgroundColor(self):
         """ Check if item matches your search. """
-        SearchMatchColorProperty = self.Take.PropertyList.Find(self.PROPERTY_NAME_SEARCH_MATCH_COLOR, False)
-        if SearchMatchColorProperty:
-            return True
+        return self.SearchMatchColor is not None
+
 
 
 # ---------------------------------------------------------------------------------------------------------------------------- #
@@ -377,6 +1040,33 @@ class MainWidget(QtWidgets.QWidget):
     COLOR_RED = (230,130,130)
     COLOR_PINK = (250,195,220)
 
+    # Names of colors used by search queries, e.g. color:red.
+    COLOR_NAMES = {
+        COLOR_PURPLE: "purple",
+        COLOR_BLUE: "blue",
+        COLOR_GREEN: "green",
+        COLOR_YELLOW: "yellow",
+        COLOR_ORANGE: "orange",
+        COLOR_PINK: "pink",
+        COLOR_RED: "red",
+    }
+
+    # Set background color of takes that match your search.
+    COLOR_SEARCH_MATCH = (10,60,10)
+
+    # Set how long typing has to pause before searching, in milliseconds, and how many takes are searched between UI events.
+    SEARCH_DELAY = 150
+    SEARCH_SLICE_SIZE = 500
+
+    # Set max number of takes highlighted by a fuzzy search.
+    FUZZY_SEARCH_LIMIT = 50
+
+    # Set how long duplicating, deleting and grouping may run before the UI gets to handle events, in milliseconds.
+    TASK_TIME_BUDGET = 30
+
+    # Set tooltip of search bar, explaining the queries it takes.
+    SEARCH_TOOLTIP = "Search by name, or filter with color:red group:Name invalid:true len>20 frames>300. Start a term with - to exclude it."
+
     def __init__(self, Parent = None): 
         super().__init__(Parent)
 
@@ -408,8 +1098,39 @@ class MainWidget(QtWidgets.QWidget):
         self.SearchBar = QtWidgets.QLineEdit()
         self.SearchBar.setPlaceholderText("Search...")
         self.SearchBar.setClearButtonEnabled(True)
+        self.SearchBar.setToolTip(self.SEARCH_TOOLTIP)
         # Connect the search bar text change event to the search function
-        self.SearchBar.textChanged.connect(self.Search)
+        self.SearchBar.textChanged.connect(self.OnSearchTextChanged)
+        # Toggle between matching exact text and matching characters in order, e.g. wlkfwd finds Walk_Forward.
+        self.bIsFuzzySearch = False
+        self.ActionFuzzySearch = self.SearchBar.addAction(QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.SP_FileDialogContentsView), QtWidgets.QLineEdit.TrailingPosition)
+        self.ActionFuzzySearch.setCheckable(True)
+        self.ActionFuzzySearch.setToolTip("Fuzzy search: Off")
+        self.ActionFuzzySearch.toggled.connect(self.SetFuzzySearch)
+        # Toggle between highlighting matches and hiding takes that don't match.
+        self.bIsFilterMode = False
+        self.ActionFilterMode = self.SearchBar.addAction(QtWidgets.QApplication.style().standardIcon(QtWidgets.QStyle.SP_FileDialogListView), QtWidgets.QLineEdit.TrailingPosition)
+        self.ActionFilterMode.setCheckable(True)
+        self.ActionFilterMode.setToolTip("Hide takes that don't match: Off")
+        self.ActionFilterMode.toggled.connect(self.SetFilterMode)
+        # Takes shown while filtering, which are matches and every group they are inside of. None if no takes are hidden.
+        self.FilterVisibleTakes: set[FBTake] = None
+        # Collapsed groups that were expanded to show matches while filtering. They are collapsed again once filtering stops, and their saved state is left as it is.
+        self.FilterExpandedTakes: set[FBTake] = set()
+        self.bIsExpandingForFilter = False
+        # (Call function) Search once typing has paused.
+        self.SearchDelayTimer = QTimer()
+        self.SearchDelayTimer.setSingleShot(True)
+        self.SearchDelayTimer.timeout.connect(self.StartSearchPass)
+        # (Call function) Run search in slices between UI events.
+        self.SearchSliceTimer = QTimer()
+        self.SearchSliceTimer.setSingleShot(True)
+        self.SearchSliceTimer.timeout.connect(self.ContinueSearchPass)
+        # Search that is currently running, increased on every new search so older ones know to stop.
+        self.SearchPass: types.GeneratorType = None
+        self.SearchGeneration = 0
+        # Takes that are currently highlighted as matching your search.
+        self.SearchMatches: set[FBTake] = set()
 
 
 
@@ -423,7 +1144,10 @@ class MainWidget(QtWidgets.QWidget):
         self.TakeList.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.TakeList.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
         self.TakeList.setEditTriggers(QtWidgets.QAbstractItemView.EditKeyPressed)
-        self.TakeList.header().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        # All rows share the same height, and the column width is tracked by the tool, so the view never has to measure every row.
+        # This only keeps repaint and resize cost flat. Every take at top level or inside an expanded group still has its own item, only children of collapsed groups are left without one.
+        self.TakeList.setUniformRowHeights(True)
+        self.TakeList.header().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
         self.TakeList.header().setStretchLastSection(False)
         self.TakeList.resizeEvent = self.OnResize
 
@@ -471,6 +1195,10 @@ class MainWidget(QtWidgets.QWidget):
         self.MoveTakesTimer = QTimer()
         self.MoveTakesTimer.setSingleShot(True)
         self.MoveTakesTimer.timeout.connect(self.MoveTakeItemsOutput)
+        # (Call function) Run search again once after a burst of native changes.
+        self.SearchRefreshTimer = QTimer()
+        self.SearchRefreshTimer.setSingleShot(True)
+        self.SearchRefreshTimer.timeout.connect(self.RefreshSearch)
         # (Call function) Selecting items in list also selects takes in MotionBuilder navigator.
         self.TakeList.itemSelectionChanged.connect(self.MakeMoBuSelection)
 
@@ -486,7 +1214,7 @@ class MainWidget(QtWidgets.QWidget):
         # Set no focus policy which disables all default shortcuts, but fixes dot-rectangle background on selected item.
         self.TakeList.setFocusPolicy(QtCore.Qt.NoFocus)
 
-        self.ShortcutRefresh =   QShortcut(QKeySequence("F5"),     self.TakeList, self.RefreshTakeList)
+        self.ShortcutRefresh =   QShortcut(QKeySequence("F5"),     self.TakeList, self.OnShortcutRefresh)
         self.ShortcutNew =       QShortcut(QKeySequence("Ctrl+N"), self.TakeList, self.OnClickActionNew)
         self.ShortcutDuplicate = QShortcut(QKeySequence("Ctrl+D"), self.TakeList, self.OnClickActionDuplicate)
         self.ShortcutRename =    QShortcut(QKeySequence("F2"),     self.TakeList, self.OnClickActionRename)
@@ -506,6 +1234,8 @@ class MainWidget(QtWidgets.QWidget):
         # Warning label.
         self.LabelWarnings = QtWidgets.QLabel(self)
         self.LabelWarnings.setCursor(QtGui.QCursor(QtCore.Qt.WhatsThisCursor))
+        # Warnings of every take that has any, in list order.
+        self.WarningsByTake: dict[FBTake, tuple[str, ...]] = {}
         
 
 
@@ -569,6 +1299,35 @@ class MainWidget(QtWidgets.QWidget):
         self.bIsSelectingTakesFromTool = False
         self.bIsRenamingTakes = False
 
+        # Native events waiting to be applied, and how many of them have been merged.
+        self.ClearNativeEventQueue()
+        self.NativeEventStats = {"Received": 0, "Applied": 0, "Merged": 0, "Flushes": 0}
+        self.NativeEventTimer = QTimer()
+        self.NativeEventTimer.setSingleShot(True)
+        self.NativeEventTimer.timeout.connect(self.FlushNativeEventQueue)
+
+        # Index of every item in list by the take it represents.
+        self.ItemsByTake: dict[FBTake, TakeTreeItem] = {}
+        # Width needed to show the widest item in list.
+        self.ContentWidth = 0
+        # Group structure of takes.
+        self.Hierarchy = TakeHierarchy()
+        # Names of all takes, so searching doesn't have to go through every take in scene.
+        self.NameIndex = SearchIndex.NameIndex()
+        # Values of takes that search queries are tested against.
+        self.QueryTable = SceneTakeTable(self)
+        # Takes that are selected natively, as far as the tool knows. Selection is synced by the difference to it.
+        self.LastSyncedSelection: set[FBTake] = set()
+        # True once the tool has reordered takes natively, the native take list may not show that order until it is refreshed.
+        self.bHasReorderedTakesNatively = False
+        # True while the native take list is being refreshed, the take it creates and deletes never shows up in the tool.
+        self.bIsRefreshingNativeList = False
+        # Number of transactions currently open, and the work they defer until the outermost one commits.
+        self.TransactionDepth = 0
+        self.ClearTransactionWork()
+        # Duplicate, delete or group that is currently running in slices between UI events.
+        self.ActiveTask: TaskScheduler.SlicedTask = None
+
         self.RefreshTakeList()
         self.RegisterNativeMoBuEvents()
         ConnectToCloseEvent(self, self.onClose)
@@ -580,30 +1339,29 @@ class MainWidget(QtWidgets.QWidget):
 
 
 
-    def RefreshTakeList(self, bClearSearchBar = True):
-        """ Refresh items in list. """
-        self.bIsUpdatingNatively = True
-        TopLevelItems = self.GetAllListTopLevelItems()
-        for Item in TopLevelItems:
-            self.GetParent(Item).removeChild(Item)
+    def OnShortcutRefresh(self):
+        """ Rebuild list from shortcut, unless a task is still changing takes. """
+        if self.IsTaskRunning():
+            return
+        self.RefreshTakeList()
 
-        for Take in System.Scene.Takes:
-            item = TakeTreeItem(Take)
-            self.TakeList.addTopLevelItem(item)
-            if Take == System.CurrentTake:
-                item.SelectActiveTake(bUpdateGuiOnly = True)
 
-        Root = self.TakeList.invisibleRootItem()
-        for Item in self.GetAllListItems():
-            ParentTake = Item.GetParentTake()
-            if ParentTake:
-                ParentItem = self.GetItemByTake(ParentTake)
-                if ParentItem:
-                    # Take away children from old parent. 
-                    Root.takeChild(Root.indexOfChild(Item))
-                    # Add children to new parent.
-                    ParentItem.addChild(Item)
-            Item.setExpanded(Item.GetItemExpanded())
+    def RefreshTakeList(self, bClearSearchBar = True, bReconcile = False):
+        """
+        Refresh items in list.
+        Args:
+            bClearSearchBar - Clear search bar, otherwise search is run again.
+            bReconcile - Only insert, remove, reparent or reorder the items that differ from scene. Keeps scroll position, selection and item caches.
+        """
+        self.bIsUpdatingNatively = True
+        if bReconcile:
+            self.UpdateContentWidth(self.ReconcileTakeList())
+        else:
+            self.RebuildTakeList()
+            self.UpdateContentWidth()
+        self.ValidateItemIndex()
+        if DEBUG_REPORT_STATS:
+            print(f"{TOOL_NAME}: Refresh repaired {len(self.Hierarchy.RepairedTakes)} broken group links.")
         # Check if take name is valid.
         self.ValidateTakeNames()
         # Clear search bar
@@ -613,6 +1371,188 @@ class MainWidget(QtWidgets.QWidget):
             if self.SearchBar.text():
                 self.Search(self.SearchBar.text())            
         self.bIsUpdatingNatively = False
+
+
+    def RebuildTakeList(self):
+        """ Remove all items and create new ones for every take in scene. """
+        TopLevelItems = self.GetAllListTopLevelItems()
+        for Item in TopLevelItems:
+            self.GetParent(Item).removeChild(Item)
+        self.ItemsByTake.clear()
+        # New items start without search highlight, and aren't hidden.
+        self.SearchMatches = set()
+        self.FilterVisibleTakes = None
+        self.FilterExpandedTakes = set()
+        # Read metadata of all takes once per scene, then index take IDs once so that resolving parents below doesn't search the whole scene per take.
+        # Legacy properties are migrated before take IDs are resolved, so merged takes keep their own group links when they are given new IDs.
+        MetadataStore.Load()
+        MetadataStore.MigrateLegacyProperties()
+        UniqueIdRegistry.Rebuild()
+        MetadataStore.ClearIncomingRecords()
+
+        # Build group structure once, repairing any broken links.
+        Takes = list(System.Scene.Takes)
+        self.NameIndex.Rebuild({Take: Take.Name for Take in Takes})
+        self.QueryTable.Clear()
+        self.LastSyncedSelection = {Take for Take in Takes if Take.Selected}
+        self.Hierarchy.Build(Takes)
+
+        # Only top level takes and children of expanded groups get an item, children of collapsed groups are created once they are needed.
+        NewTopLevelItems = [self.CreateItem(Take) for Take in Takes if self.Hierarchy.GetParent(Take) is None]
+        self.TakeList.addTopLevelItems(NewTopLevelItems)
+        for Item in NewTopLevelItems:
+            if not Item.bChildrenMaterialized and Item.GetItemExpanded():
+                self.MaterializeChildren(Item)
+                Item.setExpanded(True)
+
+
+    def ReconcileTakeList(self) -> list[TakeTreeItem]:
+        """ Update list to match scene by only touching the items that differ. Returns the items that were inserted or moved. """
+        Root = self.TakeList.invisibleRootItem()
+        Takes = list(System.Scene.Takes)
+        self.Hierarchy.Build(Takes)
+        # Takes inside groups whose children haven't been created yet don't get an item.
+        bShouldHaveItemByTake: dict[FBTake, bool] = {}
+        def ShouldHaveItem(Take: FBTake) -> bool:
+            if Take not in bShouldHaveItemByTake:
+                ParentTake = self.Hierarchy.GetParent(Take)
+                if ParentTake is None:
+                    bShouldHaveItemByTake[Take] = True
+                else:
+                    ParentItem = self.ItemsByTake.get(ParentTake)
+                    bShouldHaveItemByTake[Take] = ParentItem is not None and ParentItem.bChildrenMaterialized and ShouldHaveItem(ParentTake)
+            return bShouldHaveItemByTake[Take]
+        for Take in Takes:
+            ShouldHaveItem(Take)
+        # Remove items of takes that are no longer in scene, or that are now inside a collapsed group.
+        for Take, Item in list(self.ItemsByTake.items()):
+            if not bShouldHaveItemByTake.get(Take, False):
+                CurrentParent = self.GetCurrentParent(Item)
+                if CurrentParent is not None:
+                    CurrentParent.removeChild(Item)
+                self.UnregisterItem(Item)
+        # Create items for new takes.
+        for Take in Takes:
+            if bShouldHaveItemByTake[Take] and Take not in self.ItemsByTake:
+                self.CreateItem(Take)
+
+        # Items that are taken out of list, together with whether they were selected.
+        MovedItems: list[tuple[TakeTreeItem, bool]] = []
+        def TakeOut(Parent, Item):
+            MovedItems.append((Item, Item.isSelected()))
+            Parent.takeChild(Parent.indexOfChild(Item))
+
+        # Take out items that are under the wrong parent, and collect expected children of every parent in scene order.
+        ExpectedChildrenByParent: dict[FBTake, list[TakeTreeItem]] = {None: []}
+        for Take in Takes:
+            if not bShouldHaveItemByTake[Take]:
+                continue
+            Item = self.ItemsByTake[Take]
+            ParentTake = self.Hierarchy.GetParent(Take)
+            ExpectedParent = Root if ParentTake is None else self.ItemsByTake[ParentTake]
+            ExpectedChildrenByParent.setdefault(ParentTake, []).append(Item)
+            CurrentParent = self.GetCurrentParent(Item)
+            if CurrentParent is None:
+                MovedItems.append((Item, False))
+            elif CurrentParent != ExpectedParent:
+                TakeOut(CurrentParent, Item)
+
+        # Every parent now only holds children that belong to it. Keep the longest run that is already in order and move the rest.
+        for ParentTake, ExpectedChildren in ExpectedChildrenByParent.items():
+            ParentItem = Root if ParentTake is None else self.ItemsByTake[ParentTake]
+            CurrentChildren = self.GetChildItems(ParentItem)
+            if CurrentChildren == ExpectedChildren:
+                continue
+            ExpectedIndices = {id(Item): Index for Index, Item in enumerate(ExpectedChildren)}
+            Positions = [ExpectedIndices[id(Item)] for Item in CurrentChildren]
+            StableIndices = set(GetLongestIncreasingSubsequence(Positions))
+            for Index, Item in enumerate(CurrentChildren):
+                if Index not in StableIndices:
+                    TakeOut(ParentItem, Item)
+            for Index, Item in enumerate(ExpectedChildren):
+                if ParentItem.child(Index) != Item:
+                    ParentItem.insertChild(Index, Item)
+
+        # Groups that haven't created their children yet may have gained or lost children.
+        for Item in self.ItemsByTake.values():
+            if not Item.bChildrenMaterialized:
+                self.UpdateChildIndicator(Item)
+        # Restore state that Qt drops when an item is taken out.
+        for Item, bWasSelected in MovedItems:
+            if bWasSelected:
+                Item.setSelected(True)
+            if self.Hierarchy.HasChildren(Item.Take):
+                self.RestoreItemExpanded(Item)
+        self.ApplyFilterToItems([Item for Item, bWasSelected in MovedItems])
+        return [Item for Item, bWasSelected in MovedItems]
+
+
+    def CreateItem(self, Take: FBTake) -> TakeTreeItem:
+        """ Create and index a new item for take. Children of the take don't get items until they are needed. """
+        Item = TakeTreeItem(Take)
+        self.RegisterItem(Item)
+        if Take == System.CurrentTake:
+            Item.SelectActiveTake(bUpdateGuiOnly = True)
+        if Take in self.SearchMatches:
+            Item.SetSearchMatchBackgroundColor(self.COLOR_SEARCH_MATCH)
+        Item.bChildrenMaterialized = False
+        self.UpdateChildIndicator(Item)
+        return Item
+
+
+    def UpdateChildIndicator(self, Item: TakeTreeItem):
+        """ Show expand arrow on a group whose children haven't been created yet. """
+        if self.Hierarchy.HasChildren(Item.Take):
+            Item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+        else:
+            # Nothing left to create.
+            Item.bChildrenMaterialized = True
+            Item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+
+    def MaterializeChildren(self, Item: TakeTreeItem):
+        """ Create items for children of a group the first time they are needed. Children that are expanded groups create theirs as well. """
+        if Item.bChildrenMaterialized:
+            return
+        Item.bChildrenMaterialized = True
+        Item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+        bWasUpdatingNatively = self.bIsUpdatingNatively
+        self.bIsUpdatingNatively = True
+        # Children that already have an item, e.g. ones that were just dropped into the group, are kept as they are.
+        ChildItems = [self.CreateItem(ChildTake) for ChildTake in self.Hierarchy.GetChildren(Item.Take) if ChildTake not in self.ItemsByTake]
+        Item.addChildren(ChildItems)
+        self.ApplyFilterToItems(ChildItems)
+        for ChildItem in ChildItems:
+            if not ChildItem.bChildrenMaterialized and ChildItem.GetItemExpanded():
+                self.MaterializeChildren(ChildItem)
+                ChildItem.setExpanded(True)
+        self.bIsUpdatingNatively = bWasUpdatingNatively
+        self.UpdateContentWidth(ChildItems)
+
+
+    def MaterializeItem(self, Take: FBTake) -> TakeTreeItem:
+        """ Get item of take, creating the items of every collapsed group it is inside of if needed. """
+        Item = self.ItemsByTake.get(Take)
+        if Item is not None:
+            return Item
+        ParentTake = self.Hierarchy.GetParent(Take)
+        if ParentTake is None:
+            return None
+        ParentItem = self.MaterializeItem(ParentTake)
+        if ParentItem is None:
+            return None
+        self.MaterializeChildren(ParentItem)
+        return self.ItemsByTake.get(Take)
+
+
+    def GetAllTakesInListOrder(self) -> list[FBTake]:
+        """ Get all takes in list order, including the ones inside collapsed groups that don't have an item yet. """
+        Takes = []
+        for Item in self.GetAllListItems():
+            Takes.append(Item.Take)
+            if not Item.bChildrenMaterialized:
+                Takes.extend(self.Hierarchy.GetDescendants(Item.Take))
+        return Takes
         
 
 
@@ -628,13 +1568,18 @@ class MainWidget(QtWidgets.QWidget):
         Application.OnFileNewCompleted.Add(self.OnFileOpenCompleted)
         Application.OnFileOpen.Add(self.OnFileOpen)
         Application.OnFileNew.Add(self.OnFileOpen)
-        Application.OnFileMerge.Add(self.OnFileOpen)
+        Application.OnFileMerge.Add(self.OnFileMerge)
         Application.OnFileSave.Add(self.OnSaveRequest)
 
 
     def onClose(self, *args):
         """ Stop register when closing the tool. """
+        # Finish what a running task has done so far.
+        if self.ActiveTask is not None:
+            self.ActiveTask.Cancel()
         self.UnRegisterNativeMoBuEvents()
+        # Make sure metadata changes are in scene, the scene can still be saved after the tool is closed.
+        MetadataStore.Save()
 
 
     def UnRegisterNativeMoBuEvents(self):
@@ -645,41 +1590,71 @@ class MainWidget(QtWidgets.QWidget):
         Application.OnFileNewCompleted.Remove(self.OnFileOpenCompleted)
         Application.OnFileOpen.Remove(self.OnFileOpen)
         Application.OnFileNew.Remove(self.OnFileOpen)
-        Application.OnFileMerge.Remove(self.OnFileOpen)
+        Application.OnFileMerge.Remove(self.OnFileMerge)
         Application.OnFileSave.Remove(self.OnSaveRequest)
 
 
+    def IsToolChangingTakes(self):
+        """ Check if takes are currently being changed by the tool itself, in which case native events have to be handled right away. """
+        return self.bIsMovingTakesFromTool or self.bIsRenamingTakes or self.bIsSettingActiveTakeFromTool or self.bIsSelectingTakesFromTool
+
+
     def OnTakeChanged(self, Scene: FBScene, Event: FBEventTakeChange):
         """ Signal if any takes are changed natively. """
+        if self.bIsRefreshingNativeList:
+            return
+        # Changes made by the tool expect the list to be updated right away.
+        if self.IsToolChangingTakes():
+            self.ApplyTakeChange(Event.Type, Event.Take)
+        else:
+            self.QueueNativeEvent(Event.Type, Event.Take)
+
+
+    def ApplyTakeChange(self, EventType: FBTakeChangeType, Take: FBTake):
+        """ Update list from a single take change event. """
         self.bIsUpdatingNatively = True
+        # Keep take ID and name index up to date, no matter where the change came from.
+        if EventType == FBTakeChangeType.kFBTakeChangeAdded:
+            UniqueIdRegistry.Register(Take)
+            self.NameIndex.Add(Take, Take.Name)
+        elif EventType == FBTakeChangeType.kFBTakeChangeRemoved:
+            UniqueIdRegistry.Unregister(Take)
+            self.NameIndex.Remove(Take)
+            self.QueryTable.Forget(Take)
+            self.LastSyncedSelection.discard(Take)
+        elif EventType == FBTakeChangeType.kFBTakeChangeRenamed:
+            self.NameIndex.Add(Take, Take.Name)
         # New / Duplicate / Group.
-        if Event.Type == FBTakeChangeType.kFBTakeChangeAdded:   
-            Item = TakeTreeItem(Event.Take)
+        if EventType == FBTakeChangeType.kFBTakeChangeAdded:   
+            Item = TakeTreeItem(Take)
             self.AddNewItemsToList(Item)
             if len(System.Scene.Takes) == 1:
-                self.RefreshTakeList(bClearSearchBar = False)
+                self.RefreshTakeList(bClearSearchBar = False, bReconcile = True)
                 if self.SearchBar.text():
                     self.Search(self.SearchBar.text())
         # Rename.
-        elif Event.Type == FBTakeChangeType.kFBTakeChangeRenamed:
-            Item = self.GetItemByTake(Event.Take)
+        elif EventType == FBTakeChangeType.kFBTakeChangeRenamed:
+            Item = self.GetItemByTake(Take)
             self.RenameTakeOnListOnly(Item)
             if self.SearchBar.text():
                 self.Search(self.SearchBar.text())
         # Delete.
-        elif Event.Type == FBTakeChangeType.kFBTakeChangeRemoved and not self.bIsMovingTakesFromTool:
-            Item = self.GetItemByTake(Event.Take)
+        elif EventType == FBTakeChangeType.kFBTakeChangeRemoved and not self.bIsMovingTakesFromTool:
+            Item = self.GetItemByTake(Take)
             self.DeleteTakeItems(Item, bDeleteChildren = False, bUpdateGuiOnly = True)
         # Move.
-        elif Event.Type == FBTakeChangeType.kFBTakeChangeMoved and not self.bIsMovingTakesFromTool:
-            self.RefreshTakeList(bClearSearchBar = False)
-            Item = self.GetItemByTake(Event.Take)
+        elif EventType == FBTakeChangeType.kFBTakeChangeMoved and not self.bIsMovingTakesFromTool:
+            Item = self.GetItemByTake(Take)
+            if Item is None:
+                self.RefreshTakeList(bClearSearchBar = False, bReconcile = True)
+                Item = self.GetItemByTake(Take)
+            else:
+                self.MoveItemToScenePosition(Item)
             if IsBound(Item):
                 Item.setSelected(True)
-            if self.SearchBar.text():
-                self.Search(self.SearchBar.text())
+            self.RequestSearchRefresh()
         # Current Active Take.
-        elif Event.Type == FBTakeChangeType.kFBTakeChangeOpened and not self.bIsSettingActiveTakeFromTool and not self.bIsMovingTakesFromTool:
+        elif EventType == FBTakeChangeType.kFBTakeChangeOpened and not self.bIsSettingActiveTakeFromTool and not self.bIsMovingTakesFromTool:
             self.SetCurrentTakeListOnly()
             if self.SearchBar.text():
                 self.Search(self.SearchBar.text())
@@ -688,39 +1663,321 @@ class MainWidget(QtWidgets.QWidget):
 
     def OnSceneChanged(self, Scene: FBScene, Event: FBEventSceneChange):
         """ Signal if anything in scene is changed natively. """
-        # Filter to takes only.
-        if isinstance(Event.Component, FBTake):
+        # Filter to take selection only.
+        if not isinstance(Event.Component, FBTake) or self.bIsSelectingTakesFromTool:
+            return
+        if Event.Type in (FBSceneChangeType.kFBSceneChangeSelect, FBSceneChangeType.kFBSceneChangeUnselect):
+            self.QueueNativeEvent(Event.Type, Event.Component)
+
+
+
+    # ----------------- NATIVE EVENT QUEUE ----------------- #
+
+
+
+    def ClearNativeEventQueue(self):
+        """ Forget all queued native events. """
+        self.PendingAddedTakes: dict[FBTake, None] = {}
+        self.PendingRemovedTakes: dict[FBTake, None] = {}
+        self.PendingRenamedTakes: dict[FBTake, None] = {}
+        self.PendingMovedTakes: dict[FBTake, None] = {}
+        self.PendingSelection: dict[FBTake, bool] = {}
+        self.bPendingActiveTakeChange = False
+
+
+    def QueueNativeEvent(self, EventType, Take: FBTake):
+        """ Queue a native take event. Events are merged per take into one net change, which is applied once control returns to the event loop. """
+        self.NativeEventStats["Received"] += 1
+        if EventType == FBTakeChangeType.kFBTakeChangeAdded:
+            # A take that is removed and added back again, e.g. when reconnected, has only moved.
+            if Take in self.PendingRemovedTakes:
+                del self.PendingRemovedTakes[Take]
+                self.PendingMovedTakes[Take] = None
+            else:
+                self.PendingAddedTakes[Take] = None
+        elif EventType == FBTakeChangeType.kFBTakeChangeRemoved:
+            self.PendingRenamedTakes.pop(Take, None)
+            self.PendingMovedTakes.pop(Take, None)
+            self.PendingSelection.pop(Take, None)
+            # A take that is added and removed again never has to show up in list.
+            if Take in self.PendingAddedTakes:
+                del self.PendingAddedTakes[Take]
+            else:
+                self.PendingRemovedTakes[Take] = None
+        elif EventType == FBTakeChangeType.kFBTakeChangeRenamed:
+            # New takes get their item with the latest name anyway.
+            if Take not in self.PendingAddedTakes:
+                self.PendingRenamedTakes[Take] = None
+        elif EventType == FBTakeChangeType.kFBTakeChangeMoved:
+            if Take not in self.PendingAddedTakes:
+                self.PendingMovedTakes[Take] = None
+        elif EventType == FBTakeChangeType.kFBTakeChangeOpened:
+            self.bPendingActiveTakeChange = True
+        elif EventType == FBSceneChangeType.kFBSceneChangeSelect:
+            self.PendingSelection[Take] = True
+        elif EventType == FBSceneChangeType.kFBSceneChangeUnselect:
+            self.PendingSelection[Take] = False
+        if not self.NativeEventTimer.isActive():
+            self.NativeEventTimer.start(0)
+
+
+    def FlushNativeEventQueue(self, bForce = False):
+        """
+        Apply all queued native events as one net change set in a single pass.
+        Args:
+            bForce - Apply events even inside a transaction, otherwise they wait until it commits.
+        """
+        if self.IsInTransaction() and not bForce:
+            return
+        AddedTakes = list(self.PendingAddedTakes)
+        RemovedTakes = list(self.PendingRemovedTakes)
+        RenamedTakes = list(self.PendingRenamedTakes)
+        MovedTakes = list(self.PendingMovedTakes)
+        Selection = dict(self.PendingSelection)
+        bActiveTakeChanged = self.bPendingActiveTakeChange
+        self.ClearNativeEventQueue()
+        NumberOfChanges = len(AddedTakes) + len(RemovedTakes) + len(RenamedTakes) + len(MovedTakes) + len(Selection) + int(bActiveTakeChanged)
+        if not NumberOfChanges:
+            return
+        self.bIsUpdatingNatively = True
+        # Keep take ID and name index up to date.
+        for Take in RemovedTakes:
+            UniqueIdRegistry.Unregister(Take)
+            self.NameIndex.Remove(Take)
+            self.QueryTable.Forget(Take)
+            self.LastSyncedSelection.discard(Take)
+        UniqueIdRegistry.ResolveDuplicates([Take for Take in AddedTakes if IsBound(Take)])
+        for Take in AddedTakes + RenamedTakes:
+            if IsBound(Take):
+                self.NameIndex.Add(Take, Take.Name)
+        # Delete deepest takes first, so every child still in a removed take is kept. Kept children skip groups that were removed as well.
+        RemovedTakeSet = set(RemovedTakes)
+        bHasChildrenWithoutItems = False
+        for Take in sorted(RemovedTakes, key = self.Hierarchy.GetDepth, reverse = True):
+            Item = self.GetItemByTake(Take)
+            if Item is not None:
+                self.DeleteTakeItems(Item, bDeleteChildren = False, bUpdateGuiOnly = True, bDeferBookkeeping = True, RemovedTakes = RemovedTakeSet)
+            elif self.RemoveTakeWithoutItem(Take, RemovedTakeSet):
+                bHasChildrenWithoutItems = True
+        # New and moved takes are placed in one pass, as are children of a removed collapsed group that moved to a shown group. A single move only touches its own row.
+        if AddedTakes or len(MovedTakes) > 1 or bHasChildrenWithoutItems:
+            self.RefreshTakeList(bClearSearchBar = False, bReconcile = True)
             self.bIsUpdatingNatively = True
-            # Take selected.
-            if Event.Type == FBSceneChangeType.kFBSceneChangeSelect:
-                if not self.bIsSelectingTakesFromTool:
-                    Item = self.GetItemByTake(Event.Component)
-                    if IsBound(Item):
-                        Item.setSelected(True)
-            # Take deselected.
-            elif Event.Type == FBSceneChangeType.kFBSceneChangeUnselect:
-                if not self.bIsSelectingTakesFromTool:
-                    Item = self.GetItemByTake(Event.Component)
-                    if IsBound(Item):
-                        Item.setSelected(False)
-            self.bIsUpdatingNatively = False
+        elif MovedTakes:
+            Item = self.GetItemByTake(MovedTakes[0])
+            if Item is not None:
+                self.MoveItemToScenePosition(Item)
+        for Take in MovedTakes:
+            Item = self.GetItemByTake(Take)
+            if Item is not None:
+                Item.setSelected(True)
+        # Rename.
+        RenamedItems = []
+        for Take in RenamedTakes:
+            Item = self.GetItemByTake(Take)
+            if Item is not None and IsBound(Take):
+                Item.setText(0, Take.Name)
+                RenamedItems.append(Item)
+        if RenamedItems:
+            self.UpdateContentWidth(RenamedItems)
+        # Selection.
+        for Take, bIsSelected in Selection.items():
+            Item = self.GetItemByTake(Take)
+            if Item is not None:
+                Item.setSelected(bIsSelected)
+            if bIsSelected:
+                self.LastSyncedSelection.add(Take)
+            else:
+                self.LastSyncedSelection.discard(Take)
+        # Current active take.
+        if RemovedTakes or bActiveTakeChanged:
+            self.SetCurrentTakeListOnly()
+        # Check if take name is valid.
+        if AddedTakes or RemovedTakes or RenamedTakes:
+            self.ValidateTakeNames(AddedTakes + RemovedTakes + RenamedTakes)
+        self.bIsUpdatingNatively = False
+        self.RequestSearchRefresh()
+        # Metrics.
+        self.NativeEventStats["Flushes"] += 1
+        self.NativeEventStats["Applied"] += NumberOfChanges
+        self.NativeEventStats["Merged"] = self.NativeEventStats["Received"] - self.NativeEventStats["Applied"]
+        if DEBUG_REPORT_STATS:
+            print(f"{TOOL_NAME}: Native events received {self.NativeEventStats['Received']}, applied {self.NativeEventStats['Applied']}, merged {self.NativeEventStats['Merged']} over {self.NativeEventStats['Flushes']} flushes.")
 
 
     def OnFileOpen(self, InApplication: FBApplication, Event: FBEvent):
         """ Remove when a scene is opening. """
         System.Scene.OnTakeChange.Remove(self.OnTakeChanged)
+        MetadataStore.Clear()
+        # Queued events belong to the scene that is being closed.
+        self.NativeEventTimer.stop()
+        self.ClearNativeEventQueue()
+
+
+    def OnFileMerge(self, InApplication: FBApplication, Event: FBEvent):
+        """ Remove when a scene is merging. Metadata of the current scene is kept, merged metadata is read once merge has completed. """
+        System.Scene.OnTakeChange.Remove(self.OnTakeChanged)
+        MetadataStore.bIsLoaded = False
+        # Merged files may have been saved before metadata was stored on a note.
+        MetadataStore.bMigrationPending = True
 
 
     def OnFileOpenCompleted(self, InApplication: FBApplication, Event: FBEvent):
         """ Add when a scene is completely opened. Also refresh take list. """
+        # The list is rebuilt from scratch, anything queued before is already part of it.
+        self.NativeEventTimer.stop()
+        self.ClearNativeEventQueue()
+        # Native take list of the opened scene shows its own order.
+        self.bHasReorderedTakesNatively = False
         self.RefreshTakeList()
         System.Scene.OnTakeChange.Add(self.OnTakeChanged)
         
     
     def OnSaveRequest(self, InApplication: FBApplication, Event: FBEvent):
         """ Triggers on starting a save request, before it has finished saving. """
-        # Hack fix to make sure the native take list is following the tool take list. This is done by creating and deleting a new take.
-        self.updateListHackFix()
+        # Only force the native take list to follow the tool take list if the tool has reordered takes since it was last refreshed. Scene order may already be right while the native take list still shows the old one.
+        if self.bHasReorderedTakesNatively:
+            self.SyncTakeOrderNatively()
+            self.bIsMovingTakesFromTool = False
+            # Hack fix to make sure the native take list is following the tool take list. This is done by creating and deleting a new take.
+            self.updateListHackFix()
+            self.bHasReorderedTakesNatively = False
+        # Write metadata of all takes to scene.
+        MetadataStore.Save()
+
+
+
+    # ----------------- TRANSACTIONS ----------------- #
+
+
+
+    @contextmanager
+    def Transaction(self):
+        """
+        Change many takes as one batch. Native events are queued, the list isn't repainted, and validation, search, native take order and selection run once when the outermost transaction commits.
+        Transactions can be nested, and are committed even if an error is raised inside them so the list always ends up matching scene.
+        If committing fails as well, that error is printed and the one raised inside the transaction is the one passed on.
+        """
+        self.TransactionDepth += 1
+        if self.TransactionDepth == 1:
+            self.BeginTransaction()
+        try:
+            yield self
+        except BaseException:
+            self.TransactionDepth -= 1
+            if self.TransactionDepth == 0:
+                try:
+                    self.CommitTransaction()
+                except Exception:
+                    print(f"{TOOL_NAME}: Transaction failed to commit after an error was raised inside it.\n{traceback.format_exc()}")
+            raise
+        else:
+            self.TransactionDepth -= 1
+            if self.TransactionDepth == 0:
+                self.CommitTransaction()
+
+
+    def IsInTransaction(self) -> bool:
+        """ Check if work is deferred until a transaction commits. """
+        return self.TransactionDepth > 0
+
+
+    def ClearTransactionWork(self):
+        """ Forget all work deferred by transactions. """
+        self.bTransactionValidateAll = False
+        self.TransactionValidateTakes: dict[FBTake, None] = {}
+        self.bTransactionSearch = False
+        self.bTransactionSyncTakeOrder = False
+        self.bTransactionSelection = False
+
+
+    def BeginTransaction(self):
+        """ Stop repainting list until transaction commits. """
+        self.bTransactionUpdatesEnabled = self.TakeList.updatesEnabled()
+        self.TakeList.setUpdatesEnabled(False)
+        self.TransactionStartTime = time.perf_counter()
+
+
+    def CommitTransaction(self):
+        """ Apply queued native events, then run all deferred work once. """
+        # Native events are applied while work is still deferred, so what they trigger is run once together with the rest.
+        self.TransactionDepth += 1
+        try:
+            self.NativeEventTimer.stop()
+            self.FlushNativeEventQueue(bForce = True)
+        finally:
+            self.TransactionDepth -= 1
+        bValidateAll = self.bTransactionValidateAll
+        ValidateTakes = list(self.TransactionValidateTakes)
+        bSearch = self.bTransactionSearch
+        bSyncTakeOrder = self.bTransactionSyncTakeOrder
+        bSelection = self.bTransactionSelection
+        self.ClearTransactionWork()
+        self.TakeList.setUpdatesEnabled(self.bTransactionUpdatesEnabled)
+        # Sync take order natively to match our own list.
+        if bSyncTakeOrder:
+            bWasMovingTakesFromTool = self.bIsMovingTakesFromTool
+            self.SyncTakeOrderNatively()
+            self.bIsMovingTakesFromTool = bWasMovingTakesFromTool
+        # Check if take names are valid.
+        if bValidateAll:
+            self.ValidateTakeNames()
+        elif ValidateTakes:
+            self.ValidateTakeNames(ValidateTakes)
+        if bSelection:
+            self.MakeMoBuSelection()
+        if bSearch and self.SearchBar.text():
+            self.Search(self.SearchBar.text())
+        if DEBUG_REPORT_STATS:
+            ElapsedTime = (time.perf_counter() - self.TransactionStartTime) * 1000
+            print(f"{TOOL_NAME}: Transaction committed in {ElapsedTime:.2f} ms, validated {'all' if bValidateAll else len(ValidateTakes)} takes, search {'run' if bSearch else 'skipped'}.")
+
+
+
+    # ----------------- SLICED TASKS ----------------- #
+
+
+
+    def IsTaskRunning(self) -> bool:
+        """ Check if a duplicate, delete or group is still running, in which case no other action may change takes. """
+        return self.ActiveTask is not None
+
+
+    def RunSlicedTask(self, Title: str, Steps: types.GeneratorType, NumberOfSteps: int):
+        """
+        Run steps a time slice at a time between UI events, showing progress once it takes a while.
+        Args:
+            Steps - Generator doing one step at a time, yielding the name of what it changed. It has to keep the list consistent if it is closed early.
+        """
+        self.ActiveTask = TaskScheduler.SlicedTask(self, Title, Steps, NumberOfSteps,
+            OnFinished = self.OnSlicedTaskFinished,
+            TimeBudget = self.TASK_TIME_BUDGET,
+        )
+        # Takes can't be moved by dragging while the task is changing them.
+        self.TakeList.setDragDropMode(QtWidgets.QAbstractItemView.NoDragDrop)
+        self.ActiveTask.Start()
+
+
+    @contextmanager
+    def ToolChangingTakes(self, bIsDuplicatingItems = False):
+        """ Mark takes as changed by the tool for a single step of a task, so its own native events are applied right away. Native events in between steps are queued until the task commits. """
+        self.bIsMovingTakesFromTool = True
+        self.bPreventSelectionUpdate = True
+        self.bIsDuplicatingItems = bIsDuplicatingItems
+        try:
+            yield
+        finally:
+            self.bIsMovingTakesFromTool = False
+            self.bPreventSelectionUpdate = False
+            self.bIsDuplicatingItems = False
+
+
+    def OnSlicedTaskFinished(self, Task: TaskScheduler.SlicedTask):
+        """ Allow new tasks once task is done or cancelled. """
+        self.ActiveTask = None
+        self.TakeList.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
+        if DEBUG_REPORT_STATS:
+            print(f"{TOOL_NAME}: {Task.GetReport()}")
 
 
 
@@ -780,6 +2037,21 @@ class MainWidget(QtWidgets.QWidget):
         ActionGroupCollapseAll = QtWidgets.QAction("Collapse All",self)
         ActionGroupCollapseAll.triggered.connect(self.CollapseAllItems)
 
+        # Create naming rule actions.
+        SubMenuNameRules = QtWidgets.QMenu("Naming Rules", self)
+        CurrentRuleSet = self.GetNameRuleSet()
+        for PresetName in NameValidation.PRESETS:
+            ActionNameRulePreset = QtWidgets.QAction(PresetName, self)
+            ActionNameRulePreset.setCheckable(True)
+            ActionNameRulePreset.setChecked(PresetName == CurrentRuleSet.Name)
+            ActionNameRulePreset.triggered.connect(lambda bChecked, PresetName = PresetName: self.SetNameRulePreset(PresetName))
+            SubMenuNameRules.addAction(ActionNameRulePreset)
+        SubMenuNameRules.addSeparator()
+        ActionNameAutoFixAll = QtWidgets.QAction("Auto-Fix All", self)
+        ActionNameAutoFixAll.setEnabled(bool(self.WarningsByTake))
+        ActionNameAutoFixAll.triggered.connect(self.AutoFixAllNames)
+        SubMenuNameRules.addAction(ActionNameAutoFixAll)
+
         # Show different context menu depending on if an item was selected or not.
         if not Item:
             Menu.addAction(ActionNew)
@@ -790,6 +2062,8 @@ class MainWidget(QtWidgets.QWidget):
             Menu.addAction(ActionGroupCreate)
             Menu.addAction(ActionGroupExpandAll)
             Menu.addAction(ActionGroupCollapseAll)
+            Menu.addSeparator()
+            Menu.addMenu(SubMenuNameRules)
             # Execute.
             Menu.exec_(self.TakeList.viewport().mapToGlobal(Pos))
         else:
@@ -813,6 +2087,8 @@ class MainWidget(QtWidgets.QWidget):
             Menu.addAction(ActionGroupSelected)
             Menu.addAction(ActionGroupExpandAll)
             Menu.addAction(ActionGroupCollapseAll)
+            Menu.addSeparator()
+            Menu.addMenu(SubMenuNameRules)
             # Execute.
             Menu.exec_(self.TakeList.viewport().mapToGlobal(Pos))
 
@@ -823,11 +2099,13 @@ class MainWidget(QtWidgets.QWidget):
 
 
     def GetAllListItems(self) -> list[TakeTreeItem]:
-        """ Get all items in take list. """
+        """ Get all items in take list, in list order. """
         ListOfAllItems = []
-        for TopLevelItem in self.GetAllListTopLevelItems():
-            ListOfAllItems.append(TopLevelItem) 
-            ListOfAllItems.extend(self.GetChildItems(TopLevelItem, bRecursively = True))
+        Stack = list(reversed(self.GetAllListTopLevelItems()))
+        while Stack:
+            Item = Stack.pop()
+            ListOfAllItems.append(Item)
+            Stack.extend(reversed(self.GetChildItems(Item)))
         return ListOfAllItems
 
 
@@ -849,14 +2127,22 @@ class MainWidget(QtWidgets.QWidget):
             return self.TakeList.invisibleRootItem()
 
 
+    def GetCurrentParent(self, Item: TakeTreeItem):
+        """ Get parent of item, root of the list for top level items, or None if the item isn't in list. """
+        if Item.parent():
+            return Item.parent()
+        if Item.treeWidget() is None:
+            return None
+        return self.TakeList.invisibleRootItem()
+
+
     def GetChildItems(self, ParentItem: TakeTreeItem, bRecursively = False) -> list[TakeTreeItem]:
-        """ Find all children in an item. """
+        """ Find all children in an item. Recursive results come from the group index and don't follow list order. """
+        if bRecursively:
+            return [self.ItemsByTake[Take] for Take in self.Hierarchy.GetDescendants(ParentItem.Take) if Take in self.ItemsByTake]
         ListOfChildItems = []
         for ChildIndex in range(ParentItem.childCount()):
-            ChildItem = ParentItem.child(ChildIndex)
-            ListOfChildItems.append(ChildItem)
-            if bRecursively:
-                ListOfChildItems.extend(self.GetChildItems(ChildItem, bRecursively = True))
+            ListOfChildItems.append(ParentItem.child(ChildIndex))
         return ListOfChildItems
 
 
@@ -867,10 +2153,36 @@ class MainWidget(QtWidgets.QWidget):
 
     def GetItemByTake(self, Take: FBTake):
         """ Find item that matches take. """
-        for Item in self.GetAllListItems():
-            if Item.Take == Take:
-                return Item
-        return None
+        return self.ItemsByTake.get(Take)
+
+
+
+    # ----------------- ITEM INDEX ----------------- #
+
+
+
+    def RegisterItem(self, Item: TakeTreeItem):
+        """ Add item to the take to item index. """
+        self.ItemsByTake[Item.Take] = Item
+
+
+    def UnregisterItem(self, Item: TakeTreeItem):
+        """ Remove item from the take to item index. """
+        # Only remove the entry if it still points at this item, a newer item may already own the take.
+        if self.ItemsByTake.get(Item.Take) is Item:
+            del self.ItemsByTake[Item.Take]
+
+
+    def ValidateItemIndex(self):
+        """ Check that the take to item index matches the items in list. Only runs in debug mode. """
+        if not DEBUG_VALIDATE_ITEM_INDEX:
+            return
+        AllListItems = self.GetAllListItems()
+        for Item in AllListItems:
+            if self.ItemsByTake.get(Item.Take) is not Item:
+                raise RuntimeError(f"Item index is out of sync, missing item for take: {Item.Take.Name}")
+        if len(AllListItems) != len(self.ItemsByTake):
+            raise RuntimeError(f"Item index is out of sync, {len(self.ItemsByTake)} indexed items but {len(AllListItems)} items in list!")
 
 
 
@@ -884,25 +2196,99 @@ class MainWidget(QtWidgets.QWidget):
         self.TakeList.setDisabled(False)
 
 
-    def ValidateTakeNames(self):
-        """ Check if name of existing takes don't have too long name. """
-        # Define all list items.
-        AllListItems = self.GetAllListItems()
-        # Create a list that will contain warnings.
-        Warnings = []
-        # Go through all items and check if their names are valid.
-        for Item in AllListItems:
-            TakeName: str = Item.text(0)
-            # Take names that starts with these characters will always be valid.
-            if TakeName.startswith(("=", "-")):
-                continue     
-            # Report warning if full name is longer than max limit.
-            bIsLengthValid = len(TakeName) <= MAX_PACKAGE_LENGTH
-            if not bIsLengthValid:
-                Warnings.append(f"{TakeName} - Name is too long!")
-            # Report warning if take name contains any invalid characters.
-            if not re.match(r"^[A-Za-z0-9_#=\s]*$", TakeName):
-                Warnings.append(f"{TakeName} - Contains invalid characters!")
+    def ValidateTakeNames(self, Takes: list[FBTake] = None):
+        """
+        Check if name of existing takes don't have too long name.
+        Args:
+            Takes - Takes that were added, renamed or deleted. Only these are checked again, or all takes if None.
+        """
+        # Inside a transaction, takes are collected and checked once it commits.
+        if self.IsInTransaction():
+            if Takes is None:
+                self.bTransactionValidateAll = True
+            else:
+                self.TransactionValidateTakes.update(dict.fromkeys(Takes))
+            return
+        bWarningsChanged = Takes is None
+        if Takes is None:
+            # Define all takes, also the ones in collapsed groups without an item.
+            Takes = self.GetAllTakesInListOrder()
+            self.WarningsByTake = {}
+        RuleSet = self.GetNameRuleSet()
+        for Take in Takes:
+            # Deleted takes no longer have any warnings.
+            Warnings = RuleSet.GetWarnings(Take.Name) if IsBound(Take) else ()
+            if self.WarningsByTake.get(Take, ()) == Warnings:
+                continue
+            bWarningsChanged = True
+            if Warnings:
+                self.WarningsByTake[Take] = Warnings
+            else:
+                del self.WarningsByTake[Take]
+        # Label and tooltip are only rebuilt if any warnings were added or removed.
+        if bWarningsChanged:
+            self.UpdateWarningLabel()
+
+
+    def GetNameRuleSet(self) -> NameValidation.NameRuleSet:
+        """ Get naming rules of the engine picked for this scene. """
+        PresetName = MetadataStore.GetSetting(SETTING_NAME_RULE_PRESET, NameValidation.DEFAULT_PRESET_NAME)
+        return NameValidation.PRESETS.get(PresetName, NameValidation.PRESETS[NameValidation.DEFAULT_PRESET_NAME])
+
+
+    def SetNameRulePreset(self, PresetName: str):
+        """ Validate take names against the naming rules of another engine. """
+        MetadataStore.SetSetting(SETTING_NAME_RULE_PRESET, PresetName)
+        self.ValidateTakeNames()
+
+
+    def AutoFixAllNames(self):
+        """ Rename every take with warnings to a name that follows the naming rules, as one batch. """
+        if self.IsTaskRunning():
+            return
+        RuleSet = self.GetNameRuleSet()
+        FixedNamesByTake = {}
+        for Take in self.WarningsByTake:
+            FixedName = RuleSet.GetFixedName(Take.Name)
+            if FixedName and FixedName != Take.Name:
+                FixedNamesByTake[Take] = FixedName
+        if not FixedNamesByTake:
+            WindowCreator.BasicOneButtonPopup(self,
+                Title = "Auto-Fix All",
+                WindowWidth = 300,
+                WindowHeight = 100,
+                Label = "There are no take names to fix.",
+            )
+            return
+        # (Call class) Create auto-fix window popup and customize it.
+        SingularOrPluralTake = "take" if len(FixedNamesByTake) == 1 else "takes"
+        NewWindow = WindowCreator.BasicTwoButtonPopup(self,
+            Title = "Auto-Fix All",
+            WindowWidth = 350,
+            WindowHeight = 100,
+            Label = f"Rename {len(FixedNamesByTake)} {SingularOrPluralTake} to follow the {RuleSet.Name} naming rules?",
+            Button1Name = "Rename",
+            Button1ToolTip = "Shortcut: Enter",
+            Button1Style = """QPushButton { 
+                                            background-color : rgb(60,70,80);
+                                            font-weight: bold;
+                                            }""",
+        )
+        if NewWindow.ButtonClickedValue != 1:
+            return
+        self.CancelRenameEditMode()
+        # Rename events are queued while renaming, then applied to the list, warnings and search all at once.
+        with self.Transaction():
+            for Take, FixedName in FixedNamesByTake.items():
+                Take.Name = FixedName
+
+
+    def UpdateWarningLabel(self):
+        """ Show the number of warnings in label, with all warnings in its tooltip. """
+        # Drop takes that were deleted without being reported.
+        for Take in [x for x in self.WarningsByTake if not IsBound(x)]:
+            del self.WarningsByTake[Take]
+        Warnings = [Warning for TakeWarnings in self.WarningsByTake.values() for Warning in TakeWarnings]
         # Customize warning label depending on if there are any warnings or not.
         if not Warnings:
             self.LabelWarnings.setText("No warnings detected.")
@@ -925,15 +2311,18 @@ class MainWidget(QtWidgets.QWidget):
 
     def SyncTakeOrderNatively(self):
         """ Sync take order natively to match our own list. """
-        AllListItems = self.GetAllListItems()
-        if len(AllListItems) != len(System.Scene.Takes):
+        if self.IsInTransaction():
+            self.bTransactionSyncTakeOrder = True
             return
-        SortedTakeList: list[FBTake] = []
-        for Item in AllListItems:
-            SortedTakeList.append(Item.Take)
-            Item.setExpanded(Item.GetItemExpanded())
+        SortedTakeList = self.GetAllTakesInListOrder()
+        if len(SortedTakeList) != len(System.Scene.Takes):
+            return
+        for Item in self.GetAllListItems():
+            if Item.childCount() > 0:
+                self.RestoreItemExpanded(Item)
         self.bIsMovingTakesFromTool = True
-        ApplyTakeOrder(SortedTakeList)
+        if ApplyTakeOrder(SortedTakeList):
+            self.bHasReorderedTakesNatively = True
 
 
 
@@ -945,10 +2334,17 @@ class MainWidget(QtWidgets.QWidget):
         """ Add new items to list not caring about if it's new, duplicate or group. """
         if self.bIsMovingTakesFromTool:
             self.TakeList.addTopLevelItem(Item)
+            self.RegisterItem(Item)
+            self.Hierarchy.SetParent(Item.Take, None)
+            self.ApplyFilterToItems([Item])
+            self.ValidateItemIndex()
+            self.UpdateContentWidth([Item])
 
 
     def OnClickActionNew(self):
         """ Create new empty take from current active take. """
+        if self.IsTaskRunning():
+            return
         self.bIsMovingTakesFromTool = True
         self.bPreventSelectionUpdate = True
         # Stops an item from still being in edit rename mode if a new take is created.
@@ -971,7 +2367,7 @@ class MainWidget(QtWidgets.QWidget):
             Item.setSelected(True)
             self.TakeList.editItem(Item)
         # Check if take name is valid.
-        self.ValidateTakeNames()
+        self.ValidateTakeNames([NewTake])
         self.bIsMovingTakesFromTool = False
         self.bPreventSelectionUpdate = False
         self.MakeMoBuSelection()
@@ -981,18 +2377,19 @@ class MainWidget(QtWidgets.QWidget):
 
     def updateListHackFix(self):
         """ This hack fixes a weird bug where the native take list did not update correctly when moving takes using the tool. For some reason, creating a new take fixes this. """
+        self.bIsRefreshingNativeList = True
         # Create temp take.
         TempTake = FBTake(None)
         System.Scene.Takes.append(TempTake)
         # Delete temp take.
         TempTake.FBDelete()
+        self.bIsRefreshingNativeList = False
 
 
     def OnClickActionDuplicate(self):
-        """ Duplicate takes from selection. """
-        self.bIsMovingTakesFromTool = True
-        self.bPreventSelectionUpdate = True
-        self.bIsDuplicatingItems = True
+        """ Duplicate takes from selection, a time slice at a time so many takes can be cancelled halfway. """
+        if self.IsTaskRunning():
+            return
         # Define selected items.
         SelectedItems = self.GetSelectedItems()
         # Do nothing if no items are selected.
@@ -1000,40 +2397,59 @@ class MainWidget(QtWidgets.QWidget):
             return
         # Stops an item from still being in edit rename mode if a new take is created.
         self.CancelRenameEditMode()
-        # Duplicate selected items.
-        for Item in SelectedItems:
-            DuplicatedTake = Item.Take.CopyTake(Item.Take.Name)
-            # Deselect item once it has duplicated.
-            Item.setSelected(False)
-            # Find duplicated item and select it.
-            DuplicatedItem = self.GetItemByTake(DuplicatedTake)
-            # Check if duplicated item exists.
-            if DuplicatedItem is not None:
-                # Move duplicated item to the same parent as the original item.
-                ParentTake = Item.GetParentTake()
-                if ParentTake:
-                    ParentItem = self.GetItemByTake(ParentTake)
-                    if ParentItem:
-                        self.SetItemRelationship(ParentItem, DuplicatedItem)
-                # Select duplicated item.
-                DuplicatedItem.setSelected(True)
-        self.bIsDuplicatingItems = False
-        # Sync take order natively to match our own list.
-        self.SyncTakeOrderNatively()
-        self.SetCurrentTakeListOnly()
-        # Start renaming if only 1 item was duplicated.
-        if len(SelectedItems) == 1:
-            # Deselect all models in scene as some native shortcuts may interfere when there is a selection, such as S or Shift+S keys.
-            DeselectAllModels()
-            # Start renaming duplicated item.
-            self.TakeList.editItem(DuplicatedItem)
-        # Check if take name is valid.
-        self.ValidateTakeNames()
-        self.bIsMovingTakesFromTool = False
-        self.bPreventSelectionUpdate = False
-        self.MakeMoBuSelection()
-        if self.SearchBar.text():
-            self.Search(self.SearchBar.text())
+        self.RunSlicedTask("Duplicating takes", self.IterateDuplicateTakes(SelectedItems), len(SelectedItems))
+
+
+    def IterateDuplicateTakes(self, SelectedItems: list[TakeTreeItem]):
+        """ Duplicate one take per step. If cancelled, the takes duplicated so far are kept and the list is finished the same way. """
+        DuplicatedTakes: list[FBTake] = []
+        DuplicatedItem: TakeTreeItem = None
+        bIsDone = False
+        # Native order, warnings, selection and search are updated once all takes are duplicated.
+        with self.Transaction():
+            try:
+                # Duplicate selected items.
+                for Item in SelectedItems:
+                    # Take may have been deleted natively in between slices.
+                    if not IsBound(Item.Take):
+                        continue
+                    with self.ToolChangingTakes(bIsDuplicatingItems = True):
+                        DuplicatedTake = Item.Take.CopyTake(Item.Take.Name)
+                        DuplicatedTakes.append(DuplicatedTake)
+                        # Deselect item once it has duplicated.
+                        Item.setSelected(False)
+                        # Find duplicated item and select it.
+                        DuplicatedItem = self.GetItemByTake(DuplicatedTake)
+                        # Check if duplicated item exists.
+                        if DuplicatedItem is not None:
+                            # Move duplicated item to the same parent as the original item.
+                            ParentTake = self.Hierarchy.GetParent(Item.Take)
+                            if ParentTake:
+                                ParentItem = self.GetItemByTake(ParentTake)
+                                if ParentItem:
+                                    self.SetItemRelationship(ParentItem, DuplicatedItem)
+                            # Select duplicated item.
+                            DuplicatedItem.setSelected(True)
+                    yield DuplicatedTake.Name
+                bIsDone = True
+            finally:
+                with self.ToolChangingTakes():
+                    # Copied takes share the ID of the take they were copied from, give them their own.
+                    UniqueIdRegistry.ResolveDuplicates(DuplicatedTakes)
+                    # Sync take order natively to match our own list.
+                    self.SyncTakeOrderNatively()
+                    self.SetCurrentTakeListOnly()
+                    # Start renaming if only 1 item was duplicated.
+                    if bIsDone and len(SelectedItems) == 1 and DuplicatedItem is not None:
+                        # Deselect all models in scene as some native shortcuts may interfere when there is a selection, such as S or Shift+S keys.
+                        DeselectAllModels()
+                        # Start renaming duplicated item.
+                        self.TakeList.editItem(DuplicatedItem)
+                    # Check if take name is valid.
+                    self.ValidateTakeNames(DuplicatedTakes)
+                self.MakeMoBuSelection()
+                if self.SearchBar.text():
+                    self.Search(self.SearchBar.text())
 
 
 
@@ -1043,6 +2459,8 @@ class MainWidget(QtWidgets.QWidget):
 
     def OnClickActionRename(self):
         """ Start rename edit mode from shortcut. """
+        if self.IsTaskRunning():
+            return
         # Define selected items.
         SelectedItems = self.GetSelectedItems()
         # Do nothing of no items are selected.
@@ -1063,26 +2481,41 @@ class MainWidget(QtWidgets.QWidget):
         # Only continue if item was renamed.
         if QtCore.Qt.DisplayRole not in Roles:
             return
-        self.bIsRenamingTakes = True
+        # Takes can't be renamed while a task is changing them, put the name back.
+        if self.IsTaskRunning():
+            RenamedItem: TakeTreeItem = self.TakeList.itemFromIndex(ModelIndex1)
+            if RenamedItem is not None and IsBound(RenamedItem.Take) and RenamedItem.text(0) != RenamedItem.Take.Name:
+                self.bIsUpdatingNatively = True
+                RenamedItem.setText(0, RenamedItem.Take.Name)
+                self.bIsUpdatingNatively = False
+            return
         # Define selected items.
         SelectedItems = self.GetSelectedItems()
         # Rename all selected items to newly inputed name.
         RenamedItem: TakeTreeItem = self.TakeList.itemFromIndex(ModelIndex1)
-        for Item in SelectedItems:
-            Item.Take.Name = RenamedItem.text(0)
-        # Check if take name is valid.
-        self.ValidateTakeNames()
-        self.bIsRenamingTakes = False
-        if self.SearchBar.text():
-            self.Search(self.SearchBar.text())
+        # Warnings and search are updated once all takes are renamed.
+        with self.Transaction():
+            self.bIsRenamingTakes = True
+            try:
+                for Item in SelectedItems:
+                    Item.Take.Name = RenamedItem.text(0)
+                self.UpdateContentWidth(SelectedItems)
+                # Check if take name is valid.
+                self.ValidateTakeNames([Item.Take for Item in SelectedItems])
+            finally:
+                # Native events would otherwise be treated as renames from the tool from now on.
+                self.bIsRenamingTakes = False
+            if self.SearchBar.text():
+                self.Search(self.SearchBar.text())
 
     
     def RenameTakeOnListOnly(self, Item: TakeTreeItem):
         """ Confirm rename take on list only if rename was executed natively. """
         Item.setText(0, Item.Take.Name)
+        self.UpdateContentWidth([Item])
         if not self.bIsRenamingTakes:
             # Check if take name is valid.
-            self.ValidateTakeNames()
+            self.ValidateTakeNames([Item.Take])
 
 
 
@@ -1091,8 +2524,9 @@ class MainWidget(QtWidgets.QWidget):
 
 
     def OnClickActionDelete(self):
-        """ Show delete takes popup. """
-        self.bIsMovingTakesFromTool = True
+        """ Show delete takes popup, then delete takes a time slice at a time so many takes can be cancelled halfway. """
+        if self.IsTaskRunning():
+            return
         # Define selected items.
         SelectedItems = self.GetSelectedItems()
         # Do nothing if no items are selected.
@@ -1101,11 +2535,11 @@ class MainWidget(QtWidgets.QWidget):
         # Go through every selected takes and check if they have children.
         bHasChildren = False
         for Item in SelectedItems:
-            NumberOfChildren = Item.childCount()
-            if NumberOfChildren > 0:
+            if self.Hierarchy.HasChildren(Item.Take):
                 bHasChildren = True
                 break
         # Show different popup depending on if selected takes have children or not.
+        bDeleteChildren = None
         if bHasChildren:
             # (Call class) Create delete window popup and customize it.
             NewWindow = WindowCreator.BasicThreeButtonPopup(self,
@@ -1129,12 +2563,10 @@ class MainWidget(QtWidgets.QWidget):
             )
             # Confirm deletion of parent + child.
             if NewWindow.ButtonClickedValue == 1:
-                for Item in SelectedItems:
-                    self.DeleteTakeItems(Item, bDeleteChildren = False)
+                bDeleteChildren = False
             # Confirm deletion of only parent.
             if NewWindow.ButtonClickedValue == 2:
-                for Item in SelectedItems:
-                    self.DeleteTakeItems(Item, bDeleteChildren = True)
+                bDeleteChildren = True
         else:
             # (Call class) Create delete window popup and customize it.
             NewWindow = WindowCreator.BasicTwoButtonPopup(self,
@@ -1150,16 +2582,99 @@ class MainWidget(QtWidgets.QWidget):
             )
             # Confirm deletion.
             if NewWindow.ButtonClickedValue == 1:
-                for Item in SelectedItems:
-                    self.DeleteTakeItems(Item, bDeleteChildren = False)
-        self.bIsMovingTakesFromTool = False
-        if self.SearchBar.text():
-            self.Search(self.SearchBar.text())
+                bDeleteChildren = False
+        # Do nothing if deletion was cancelled.
+        if bDeleteChildren is None:
+            return
+        # Whole deletion is planned up front, then takes are deleted back to back.
+        DeleteOrder, NewParentByTake = self.PlanTakeDeletion(SelectedItems, bDeleteChildren)
+        self.RunSlicedTask("Deleting takes", self.IterateDeleteTakes(DeleteOrder, NewParentByTake), len(DeleteOrder))
+
+
+    def GetClosestKeptParent(self, Take: FBTake, DeletedTakes) -> FBTake:
+        """ Get the closest group above take that isn't deleted as well, None for root. Children of a deleted take move to it. """
+        ParentTake = self.Hierarchy.GetParent(Take)
+        while ParentTake in DeletedTakes:
+            ParentTake = self.Hierarchy.GetParent(ParentTake)
+        return ParentTake
+
+
+    def PlanTakeDeletion(self, SelectedItems: list[TakeTreeItem], bDeleteChildren: bool) -> tuple[list[FBTake], dict[FBTake, FBTake]]:
+        """ Find every take to delete and the new parent of every child that is kept, None for root, before anything is deleted. Takes are given deepest first, so each one is childless by the time it is deleted. """
+        TakesToDelete: dict[FBTake, None] = {}
+        for Item in SelectedItems:
+            if not IsBound(Item.Take):
+                continue
+            TakesToDelete[Item.Take] = None
+            if bDeleteChildren:
+                TakesToDelete.update(dict.fromkeys(self.Hierarchy.GetDescendants(Item.Take)))
+        # Kept children move to the closest group above them that is kept.
+        NewParentByTake: dict[FBTake, FBTake] = {}
+        for Take in TakesToDelete:
+            for ChildTake in self.Hierarchy.GetChildren(Take):
+                if ChildTake in TakesToDelete:
+                    continue
+                NewParentByTake[ChildTake] = self.GetClosestKeptParent(Take, TakesToDelete)
+        DeleteOrder = sorted(TakesToDelete, key = self.Hierarchy.GetDepth, reverse = True)
+        return DeleteOrder, NewParentByTake
+
+
+    def IterateDeleteTakes(self, DeleteOrder: list[FBTake], NewParentByTake: dict[FBTake, FBTake]):
+        """
+        Delete takes back to back, one per step, as planned by PlanTakeDeletion. Native order, active take, warnings, column width and search are updated once at the end.
+        If cancelled, the takes deleted so far stay deleted and the rest keep their items, so the list is finished the same way.
+        """
+        DeletedTakes: list[FBTake] = []
+        # List is repainted once all takes are deleted.
+        with self.Transaction():
+            try:
+                for Take in DeleteOrder:
+                    # Take may have been deleted natively in between slices.
+                    if not IsBound(Take):
+                        continue
+                    with self.ToolChangingTakes():
+                        Item = self.GetItemByTake(Take)
+                        # Move kept children to their new parent. Takes with kept children were selected, so they have an item.
+                        KeptChildTakes = [ChildTake for ChildTake in self.Hierarchy.GetChildren(Take) if ChildTake in NewParentByTake]
+                        if KeptChildTakes and Item is not None:
+                            self.MaterializeChildren(Item)
+                            for ChildTake in KeptChildTakes:
+                                NewParentTake = NewParentByTake[ChildTake]
+                                NewParentItem = self.TakeList.invisibleRootItem() if NewParentTake is None else self.GetItemByTake(NewParentTake)
+                                self.SetItemRelationship(NewParentItem, self.GetItemByTake(ChildTake))
+                        # Delete take, its item has no children left.
+                        TakeName = Take.Name
+                        Take.FBDelete()
+                        DeletedTakes.append(Take)
+                        if Item is not None:
+                            self.GetParent(Item).removeChild(Item)
+                            self.UnregisterItem(Item)
+                        self.Hierarchy.Remove(Take)
+                    yield TakeName
+            finally:
+                with self.ToolChangingTakes():
+                    self.ValidateItemIndex()
+                    # Kept children were moved to the end of their new parent.
+                    self.SyncTakeOrderNatively()
+                    self.SetCurrentTakeListOnly()
+                    # Check if take name is valid.
+                    self.ValidateTakeNames(DeletedTakes)
+                    # Let column shrink if the widest take was deleted.
+                    self.UpdateContentWidth()
+                if self.SearchBar.text():
+                    self.Search(self.SearchBar.text())
 
 
-    def DeleteTakeItems(self, Item: TakeTreeItem, bDeleteChildren, bUpdateGuiOnly = False):
-        """ Confirm delete takes from selection. """
+    def DeleteTakeItems(self, Item: TakeTreeItem, bDeleteChildren, bUpdateGuiOnly = False, bDeferBookkeeping = False, RemovedTakes = ()):
+        """
+        Confirm delete takes from selection.
+        Args:
+            bDeferBookkeeping - Skip updating active take and warnings, the caller does it once after deleting many items.
+            RemovedTakes - Other takes deleted natively in the same batch. Kept children skip them and move to the closest group that is kept, so a deleted take is never given metadata.
+        """
         self.bPreventSelectionUpdate = True
+        # Children of a collapsed group need items before they can be deleted or moved.
+        self.MaterializeChildren(Item)
         # Delete children or reparent them to their parent's parent.
         for Child in self.GetChildItems(Item):
             if bDeleteChildren:
@@ -1168,8 +2683,15 @@ class MainWidget(QtWidgets.QWidget):
             else:
                 # Take away children from old parent. 
                 Item.takeChild(Item.indexOfChild(Child))
-                # Add children to new parent.
-                self.GetParent(Item).addChild(Child)
+                # Add children to new parent. Groups above a materialized item always have an item.
+                NewParentTake = self.GetClosestKeptParent(Item.Take, RemovedTakes)
+                NewParent = self.TakeList.invisibleRootItem() if NewParentTake is None else self.GetItemByTake(NewParentTake)
+                NewParent.addChild(Child)
+                if NewParentTake is None:
+                    Child.RemoveParentProperty()
+                else:
+                    Child.SetParentProperty(NewParent)
+                self.Hierarchy.SetParent(Child.Take, NewParentTake)
         # Check if deletion was executed from this tool or natively.
         if not bUpdateGuiOnly:
             Item.DeleteTake()
@@ -1177,9 +2699,13 @@ class MainWidget(QtWidgets.QWidget):
         else:
             # Delete new parent's child which is old parent.
             self.GetParent(Item).removeChild(Item)
-        self.SetCurrentTakeListOnly()
-        # Check if take name is valid.
-        self.ValidateTakeNames()
+        self.UnregisterItem(Item)
+        self.Hierarchy.Remove(Item.Take)
+        self.ValidateItemIndex()
+        if not bDeferBookkeeping:
+            self.SetCurrentTakeListOnly()
+            # Check if take name is valid.
+            self.ValidateTakeNames([Item.Take])
         self.bPreventSelectionUpdate = False
 
 
@@ -1196,25 +2722,90 @@ class MainWidget(QtWidgets.QWidget):
         self.bPreventInfiniteTimer = True
 
 
+    def RemoveTakeWithoutItem(self, Take: FBTake, RemovedTakes = ()) -> bool:
+        """
+        Remove a deleted take that is inside a collapsed group. Its children move to its parent, same as when deleting an item.
+        Returns True if children moved to a group whose children are shown, so they still need items.
+        Args:
+            RemovedTakes - Other takes deleted natively in the same batch, children move to the closest group that is kept.
+        """
+        ParentTake = self.GetClosestKeptParent(Take, RemovedTakes)
+        ChildTakes = self.Hierarchy.GetChildren(Take)
+        for ChildTake in ChildTakes:
+            if ParentTake is None:
+                MetadataStore.RemoveValue(ChildTake, TakeTreeItem.PROPERTY_NAME_GROUP)
+            else:
+                MetadataStore.SetValue(ChildTake, TakeTreeItem.PROPERTY_NAME_GROUP, GetUniqueIdByTake(ParentTake))
+            self.Hierarchy.SetParent(ChildTake, ParentTake)
+        self.Hierarchy.Remove(Take)
+        if not ChildTakes:
+            return False
+        ParentItem = None if ParentTake is None else self.GetItemByTake(ParentTake)
+        return ParentTake is None or (ParentItem is not None and ParentItem.bChildrenMaterialized)
+
+
+    def MoveItemToScenePosition(self, Item: TakeTreeItem):
+        """ Move a single item among its siblings to match where its take is in scene, after it was moved natively. The item stays in its group. """
+        Parent = self.GetParent(Item)
+        SiblingTakes = [Sibling.Take for Sibling in self.GetChildItems(Parent) if Sibling != Item]
+        # Only the positions of the take and its siblings are needed, scene is read until all of them are found.
+        WantedTakes = set(SiblingTakes)
+        WantedTakes.add(Item.Take)
+        ScenePositions: dict[FBTake, int] = {}
+        for Index, Take in enumerate(System.Scene.Takes):
+            if Take in WantedTakes:
+                ScenePositions[Take] = Index
+                if len(ScenePositions) == len(WantedTakes):
+                    break
+        TakePosition = ScenePositions.get(Item.Take)
+        if TakePosition is None:
+            return
+        # The item goes after every sibling that comes before its take in scene.
+        NewIndex = 0
+        for SiblingTake in SiblingTakes:
+            if ScenePositions.get(SiblingTake, -1) < TakePosition:
+                NewIndex += 1
+        CurrentIndex = Parent.indexOfChild(Item)
+        if CurrentIndex == NewIndex:
+            return
+        bWasSelected = Item.isSelected()
+        Parent.takeChild(CurrentIndex)
+        Parent.insertChild(NewIndex, Item)
+        # Restore state that Qt drops when an item is taken out.
+        if bWasSelected:
+            Item.setSelected(True)
+        if self.Hierarchy.HasChildren(Item.Take):
+            self.RestoreItemExpanded(Item)
+
+
     def MoveTakeItems(self, ParentModelIndex: QtCore.QModelIndex, FirstIndex: int, LastIndex: int):
         """ Move and group items in list. """
         if self.bIsUpdatingNatively or self.bIsDuplicatingItems or self.bIsToolInitialized:
             self.bIsToolInitialized = False
             return
+        # Tasks move items themselves and sync take order once they are done.
+        if self.IsTaskRunning():
+            return
         self.bPreventInfiniteTimer = False
         self.bIsMovingTakesFromTool = True
         self.bPreventSelectionUpdate = True
         # Grouping.
         Parent: TakeTreeItem = self.TakeList.itemFromIndex(ParentModelIndex)
+        # Takes dropped into a collapsed group join the children it already has.
+        if Parent is not None:
+            self.MaterializeChildren(Parent)
         for Index in range(FirstIndex, LastIndex + 1):
             if Parent is None:
                 Item: TakeTreeItem = self.TakeList.invisibleRootItem().child(Index)
                 Item.RemoveParentProperty()
+                self.Hierarchy.SetParent(Item.Take, None)
             else:
                 Item: TakeTreeItem = Parent.child(Index)
                 Item.SetParentProperty(Parent)
+                self.Hierarchy.SetParent(Item.Take, Parent.Take)
                 Parent.setExpanded(True)
             Item.setSelected(True)
+            self.UpdateContentWidth([Item])
         self.StartMoveTakesTimer()
         
     
@@ -1235,55 +2826,72 @@ class MainWidget(QtWidgets.QWidget):
 
 
     def CreateNewGroup(self):
-        """ Create new empty take group with predefined settings. """
-        self.bIsMovingTakesFromTool = True
-        self.bPreventSelectionUpdate = True
+        """ Create new empty take group with predefined settings, then group selected takes inside it a time slice at a time. """
+        if self.IsTaskRunning():
+            return
         # Stops an item from still being in edit rename mode if a new take is created.
         self.CancelRenameEditMode()
-        # Create new empty take.
-        DefaultGroupName = "===== " + "GROUP" + " ====="
-        NewTakeGroup = FBTake(DefaultGroupName)
-        # Set newly created take to be 1 frame long.
-        NewTakeGroup.LocalTimeSpan = FBTimeSpan(FBTime.Zero, FBTime(0, 0, 0, 1, 0))
-        # Append take to scene.
-        System.Scene.Takes.append(NewTakeGroup)
-        # Set current active take to be the new group.
-        System.CurrentTake = NewTakeGroup
+        with self.ToolChangingTakes():
+            # Create new empty take.
+            DefaultGroupName = "===== " + "GROUP" + " ====="
+            NewTakeGroup = FBTake(DefaultGroupName)
+            # Set newly created take to be 1 frame long.
+            NewTakeGroup.LocalTimeSpan = FBTimeSpan(FBTime.Zero, FBTime(0, 0, 0, 1, 0))
+            # Append take to scene.
+            System.Scene.Takes.append(NewTakeGroup)
+            # Set current active take to be the new group.
+            System.CurrentTake = NewTakeGroup
         # Define item group.
         NewItemGroup: TakeTreeItem = self.GetItemByTake(NewTakeGroup)
         # If any items were selected when creating the group, parent them inside the group.
         SelectedItems = self.GetSelectedItems()
-        if SelectedItems:
-            # Check if selected items have same parent.
-            CommonParent = None
-            for Item in SelectedItems:
-                NewParent = self.GetParent(Item)
-                if CommonParent and NewParent != CommonParent:
-                    CommonParent = None
-                    break
-                CommonParent = NewParent
-            # Place selected items inside newly created group.
-            for Item in SelectedItems:
-                self.SetItemRelationship(NewItemGroup, Item)
-            # If selected items had same parent before, then the new group should be placed under said parent. If not, then the group should be placed under root.
-            if CommonParent:
-                self.SetItemRelationship(CommonParent, NewItemGroup)
-            # Set group to be expanded on creation. 
-            NewItemGroup.setExpanded(True)
-        # Deselect all items.
-        self.TakeList.selectionModel().clearSelection()
-        # Deselect all models in scene as some native shortcuts may interfere when there is a selection, such as S or Shift+S keys.
-        DeselectAllModels()
-        # Select newly created group and start renaming it.
-        self.SetCurrentTakeListOnly()
-        NewItemGroup.setSelected(True)
-        self.TakeList.editItem(NewItemGroup)
-        # Check if take name is valid.
-        self.ValidateTakeNames()
-        self.bIsMovingTakesFromTool = False
-        self.bPreventSelectionUpdate = False
-        if self.SearchBar.text():
-            self.Search(self.SearchBar.text())
+        # Check if selected items have same parent.
+        CommonParent = None
+        for Item in SelectedItems:
+            NewParent = self.GetParent(Item)
+            if CommonParent and NewParent != CommonParent:
+                CommonParent = None
+                break
+            CommonParent = NewParent
+        self.RunSlicedTask("Grouping takes", self.IterateGroupTakes(NewItemGroup, SelectedItems, CommonParent), len(SelectedItems))
+
+
+    def IterateGroupTakes(self, NewItemGroup: TakeTreeItem, SelectedItems: list[TakeTreeItem], CommonParent):
+        """
+        Place one selected take inside the new group per step. If cancelled, the takes grouped so far stay in the group and it is finished the same way.
+        Args:
+            CommonParent - Parent that all selected items had, the group is placed under it. None if they had different parents.
+        """
+        # List is repainted once all takes are grouped.
+        with self.Transaction():
+            try:
+                # Place selected items inside newly created group.
+                for Item in SelectedItems:
+                    with self.ToolChangingTakes():
+                        self.SetItemRelationship(NewItemGroup, Item)
+                    yield Item.text(0)
+            finally:
+                with self.ToolChangingTakes():
+                    if SelectedItems:
+                        # If selected items had same parent before, then the new group should be placed under said parent. If not, then the group should be placed under root.
+                        if CommonParent:
+                            self.SetItemRelationship(CommonParent, NewItemGroup)
+                        # Set group to be expanded on creation. 
+                        NewItemGroup.setExpanded(True)
+                        # Sync take order natively to match our own list.
+                        self.SyncTakeOrderNatively()
+                    # Deselect all items.
+                    self.TakeList.selectionModel().clearSelection()
+                    # Deselect all models in scene as some native shortcuts may interfere when there is a selection, such as S or Shift+S keys.
+                    DeselectAllModels()
+                    # Select newly created group and start renaming it.
+                    self.SetCurrentTakeListOnly()
+                    NewItemGroup.setSelected(True)
+                    self.TakeList.editItem(NewItemGroup)
+                    # Check if take name is valid.
+                    self.ValidateTakeNames([NewItemGroup.Take])
+                if self.SearchBar.text():
+                    self.Search(self.SearchBar.text())
 
 
     def SetItemRelationship(self, Parent: TakeTreeItem, Child: TakeTreeItem):
@@ -1293,11 +2901,14 @@ class MainWidget(QtWidgets.QWidget):
         CurrentParent = self.GetParent(Child)
         CurrentParent.takeChild(CurrentParent.indexOfChild(Child))
         Parent.addChild(Child)
+        self.UpdateContentWidth([Child])
 
         if Parent == self.TakeList.invisibleRootItem():
             Child.RemoveParentProperty()      
+            self.Hierarchy.SetParent(Child.Take, None)
         else:
             Child.SetParentProperty(Parent)
+            self.Hierarchy.SetParent(Child.Take, Parent.Take)
 
 
 
@@ -1307,24 +2918,31 @@ class MainWidget(QtWidgets.QWidget):
 
     def ExpandAllItems(self):
         """ Expand all groups / parents. """
-        AllItems = self.GetAllListItems()
-        for Item in AllItems:
-            NumberOfChildren = Item.childCount()
-            if NumberOfChildren > 0:
-                self.TakeList.expandItem(Item)
+        # Parents come before their children, so every group's item exists by the time it is expanded.
+        for Take in self.GetAllTakesInListOrder():
+            if self.Hierarchy.HasChildren(Take):
+                Item = self.MaterializeItem(Take)
+                if Item is not None:
+                    self.TakeList.expandItem(Item)
 
 
     def ExpandAllChildrenOfSelectedItem(self, Item: TakeTreeItem):
         """ Expand all selected items if shift key + left click are pressed on group icon. """
         # Find and expand all children recursively of selected item.
-        for Child in self.GetChildItems(Item, bRecursively = True):
-            NumberOfChildren = Child.childCount()
-            if NumberOfChildren > 0:
-                self.TakeList.expandItem(Child)
+        for ChildTake in self.Hierarchy.GetDescendants(Item.Take):
+            if self.Hierarchy.HasChildren(ChildTake):
+                Child = self.MaterializeItem(ChildTake)
+                if Child is not None:
+                    self.TakeList.expandItem(Child)
 
 
     def OnExpand(self, Item: TakeTreeItem):
         """ Expand selected items. """
+        # Create items of children the first time the group is expanded.
+        self.MaterializeChildren(Item)
+        # Expanded to show matches while filtering, which isn't saved.
+        if self.bIsExpandingForFilter:
+            return
         # Expand all children if shift is pressed when left clicking.
         Modifiers = QtWidgets.QApplication.keyboardModifiers()
         if Modifiers == QtCore.Qt.ShiftModifier:
@@ -1333,6 +2951,21 @@ class MainWidget(QtWidgets.QWidget):
         Item.SetItemExpanded(bIsExpanded = True)
 
 
+    def RestoreItemExpanded(self, Item: TakeTreeItem):
+        """ Expand or collapse group the way it was before Qt dropped its state, e.g. when it was taken out and put back in list. """
+        if Item.Take in self.FilterExpandedTakes:
+            self.SetExpandedForFilter(Item, True)
+        else:
+            Item.setExpanded(Item.GetItemExpanded())
+
+
+    def SetExpandedForFilter(self, Item: TakeTreeItem, bIsExpanded: bool):
+        """ Expand or collapse group to show or hide matches while filtering, without saving it on the take. """
+        self.bIsExpandingForFilter = True
+        Item.setExpanded(bIsExpanded)
+        self.bIsExpandingForFilter = False
+
+
     def CollapseAllItems(self):
         """ Collapse all groups / parents. """
         AllItems = self.GetAllListItems()
@@ -1353,6 +2986,11 @@ class MainWidget(QtWidgets.QWidget):
 
     def OnCollapse(self, Item: TakeTreeItem):
         """ Collapse selected items. """
+        # Collapsed again once filtering stopped, which isn't saved.
+        if self.bIsExpandingForFilter:
+            return
+        # Group collapsed by hand stays collapsed once filtering stops.
+        self.FilterExpandedTakes.discard(Item.Take)
         self.bPreventSelectionUpdate = True
         # Deselect all children of selected item when collapsing.
         for Child in self.GetChildItems(Item, bRecursively = True):
@@ -1374,21 +3012,21 @@ class MainWidget(QtWidgets.QWidget):
 
 
     def ToggleSelectOrDeselectAll(self):
-        """ Toggle select / deselect all items in list. """
+        """ Toggle select / deselect all items in list. The list is changed in one call, and takes are then selected natively in one pass. """
         AllItems = self.GetAllListItems()
-        bItemIsSelected = True
+        if not AllItems:
+            return
+        bItemIsSelected = len(self.GetSelectedItems()) == len(AllItems)
         self.bPreventSelectionUpdate = True
-        # Check if any items are not selected in list.
-        for Item in AllItems:
-            if not Item.isSelected():
-                bItemIsSelected = False
-                break
         # Toggle all items selected / deselected
-        for Item in AllItems:
-            if bItemIsSelected:
-                Item.setSelected(False)
-            else:
-                Item.setSelected(True)
+        if bItemIsSelected:
+            self.TakeList.clearSelection()
+        else:
+            # One range per group selects every item, also inside collapsed groups.
+            Selection = QtCore.QItemSelection()
+            for Parent in [self.TakeList.invisibleRootItem()] + [Item for Item in AllItems if Item.childCount() > 0]:
+                Selection.select(self.TakeList.indexFromItem(Parent.child(0)), self.TakeList.indexFromItem(Parent.child(Parent.childCount() - 1)))
+            self.TakeList.selectionModel().select(Selection, QtCore.QItemSelectionModel.Select)
         self.bPreventSelectionUpdate = False
         self.MakeMoBuSelection()
 
@@ -1417,14 +3055,16 @@ class MainWidget(QtWidgets.QWidget):
 
     def SetCurrentTake(self, DoubleClickedItem: TakeTreeItem, ColumnIndex: int = 0):
         """ Set current active take. """
+        if self.IsTaskRunning():
+            return
         self.bIsSettingActiveTakeFromTool = True
         # Clear background color and font on current active item.
         CurrentActiveItem: TakeTreeItem = self.GetItemByTake(System.CurrentTake)
-        IsSearched = CurrentActiveItem.HasSearchMatchBackgroundColor()
-        CurrentActiveItem.DeselectActiveTake(bIsMatchedSearch = IsSearched)
-        # (Call function) Set background color and font on current take.
-        IsSearched = DoubleClickedItem.HasSearchMatchBackgroundColor()
-        DoubleClickedItem.SelectActiveTake(bUpdateGuiOnly = False, bIsMatchedSearch = IsSearched)
+        # The current take may be inside a collapsed group without an item.
+        if CurrentActiveItem is not None:
+            CurrentActiveItem.DeselectActiveTake()
+        # (Call function) Set background color and font on current take. Search highlight is kept on top of it.
+        DoubleClickedItem.SelectActiveTake(bUpdateGuiOnly = False)
         self.bIsSettingActiveTakeFromTool = False
 
 
@@ -1434,7 +3074,9 @@ class MainWidget(QtWidgets.QWidget):
         self.DeselectAllTakes()
         # (Call function) Set background color and font on current take.
         ActiveItem = self.GetItemByTake(System.CurrentTake)
-        ActiveItem.SelectActiveTake(bUpdateGuiOnly = True)   
+        # The current take may be inside a collapsed group without an item.
+        if ActiveItem is not None:
+            ActiveItem.SelectActiveTake(bUpdateGuiOnly = True)
 
 
 
@@ -1443,20 +3085,23 @@ class MainWidget(QtWidgets.QWidget):
 
 
     def MakeMoBuSelection(self):
-        """ Select takes natively also when selecting takes in tool. """
+        """ Select takes natively also when selecting takes in tool. Only takes whose selection changed since the last sync are touched. """
         if self.bIsUpdatingNatively or self.bPreventSelectionUpdate:
             return
+        if self.IsInTransaction():
+            self.bTransactionSelection = True
+            return
         self.bIsSelectingTakesFromTool = True
-        # Deselect everything except models in scene.
-        for Object in GetMoBuSelection():
-            if not isinstance(Object, FBModel):
-                Object.Selected = False
-
-        SelectedItems = self.GetSelectedItems()
+        SelectedTakes = {Item.Take for Item in self.GetSelectedItems()}
+        # Deselect takes natively that are no longer selected in tool.
+        for Take in self.LastSyncedSelection - SelectedTakes:
+            if IsBound(Take):
+                Take.Selected = False
         # Select takes natively.
-        for Item in SelectedItems:
-            if IsBound(Item.Take):
-                Item.Take.Selected = True 
+        for Take in SelectedTakes - self.LastSyncedSelection:
+            if IsBound(Take):
+                Take.Selected = True
+        self.LastSyncedSelection = SelectedTakes
         self.bIsSelectingTakesFromTool = False
 
 
@@ -1467,6 +3112,8 @@ class MainWidget(QtWidgets.QWidget):
 
     def AssignColor(self, Color, bAssignedNone = False):
         """ Assign selected takes with a color. """
+        if self.IsTaskRunning():
+            return
         # Define selected items.
         SelectedItems = self.GetSelectedItems()
         # Do nothing if no items are selected.
@@ -1481,10 +3128,14 @@ class MainWidget(QtWidgets.QWidget):
                 Item.ResetColor()
         # Deselect all items.
         self.TakeList.selectionModel().clearSelection()
+        # Color queries may match other takes now.
+        self.RequestSearchRefresh()
 
 
     def ResetAllColors(self):
         """ Resets all takes to default color. """
+        if self.IsTaskRunning():
+            return
         # (Call class) Create reset color window popup and customize it.
         NewWindow = WindowCreator.BasicTwoButtonPopup(self,
             Title = "Reset All",
@@ -1500,11 +3151,16 @@ class MainWidget(QtWidgets.QWidget):
         )
         # Confirm reset.
         if NewWindow.ButtonClickedValue == 1:
-            ListOfItems = self.GetAllListItems()
-            for Item in ListOfItems:
-                Item.ResetColor()
+            for Take in self.GetAllTakesInListOrder():
+                Item = self.GetItemByTake(Take)
+                if Item is not None:
+                    Item.ResetColor()
+                else:
+                    MetadataStore.RemoveValue(Take, TakeTreeItem.PROPERTY_NAME_COLOR)
             # Deselect all items.
             self.TakeList.selectionModel().clearSelection()
+            # Color queries may match other takes now.
+            self.RequestSearchRefresh()
 
 
 
@@ -1527,42 +3183,268 @@ class MainWidget(QtWidgets.QWidget):
 
     def OnResize(self, Event):
         """ Fix horizontal scroll bar when resizing the window. """
-        # Get width of tree widget, specifically the viewport as it takes into account of the vertical scrollbar visibility. 
+        self.ApplyColumnWidth()
+
+
+    def UpdateContentWidth(self, Items: list[TakeTreeItem] = None):
+        """
+        Update the width needed to show the widest item in list. Only measures the given items, which replaces letting the header measure every row on each layout.
+        Args:
+            Items - Items that were added, renamed or moved. Measure all items if None, which also lets the width shrink.
+        """
+        if Items is None:
+            Items = self.GetAllListItems()
+            self.ContentWidth = 0
+        # Measure with the bold font so the width also fits the active take.
+        FontMetrics = QtGui.QFontMetrics(TakeTreeItem.GetActiveTakeFont())
+        Indentation = self.TakeList.indentation()
+        for Item in Items:
+            Depth = 1
+            Parent = Item.parent()
+            while Parent:
+                Depth += 1
+                Parent = Parent.parent()
+            Width = FontMetrics.horizontalAdvance(Item.text(0)) + Indentation * Depth + 10
+            if Width > self.ContentWidth:
+                self.ContentWidth = Width
+        self.ApplyColumnWidth()
+
+
+    def ApplyColumnWidth(self):
+        """ Make the column fill the window, or fit the widest item if that is wider. """
+        # Get width of tree widget, specifically the viewport as it takes into account of the vertical scrollbar visibility.
         Width = self.TakeList.viewport().width()
-        # Because the horizontal scroll bar checks the header width, the header width has to match the window width.
-        self.TakeList.header().setMinimumSectionSize(Width)
-        self.TakeList.header().setDefaultSectionSize(Width * 2)
+        # Because the horizontal scroll bar checks the header width, the header width has to be at least the window width.
+        self.TakeList.setColumnWidth(0, max(Width, self.ContentWidth))
    
 
 
+    # ----------------- SEARCH ----------------- #
+
+
+
+    def OnSearchTextChanged(self, Text: str):
+        """ Search once typing has paused. A newer keystroke cancels any search that is still running. """
+        self.CancelSearchPass()
+        self.SearchDelayTimer.start(self.SEARCH_DELAY)
+
+
+    def CancelSearchPass(self):
+        """ Stop the search that is currently running. """
+        self.SearchGeneration += 1
+        self.SearchSliceTimer.stop()
+        self.SearchPass = None
+
+
+    def SetFuzzySearch(self, bIsFuzzySearch: bool):
+        """ Switch between exact and fuzzy search, and search again. """
+        self.bIsFuzzySearch = bIsFuzzySearch
+        if bIsFuzzySearch:
+            self.ActionFuzzySearch.setToolTip("Fuzzy search: On")
+            self.SearchBar.setPlaceholderText("Fuzzy search...")
+        else:
+            self.ActionFuzzySearch.setToolTip("Fuzzy search: Off")
+            self.SearchBar.setPlaceholderText("Search...")
+        self.StartSearchPass()
+
+
+    def StartSearchPass(self):
+        """ Start searching with the search bar text, a slice at a time between UI events. """
+        self.CancelSearchPass()
+        self.SearchPass = self.IterateSearch(self.SearchBar.text(), self.SearchGeneration, bFocusBestMatch = True)
+        self.SearchSliceTimer.start(0)
+
+
+    def ContinueSearchPass(self):
+        """ Run next slice of the search that is currently running. """
+        if self.SearchPass is None:
+            return
+        try:
+            next(self.SearchPass)
+        except StopIteration:
+            self.SearchPass = None
+            return
+        self.SearchSliceTimer.start(0)
+
+
     def Search(self, text: str):
-        """ Search for a take. """
-        if not self.SearchBar.text():
-            CurrentTakeItem = self.GetItemByTake(System.CurrentTake)
-            for item in self.GetAllListItems():
-                if CurrentTakeItem == item:
-                    item.SelectActiveTake(bUpdateGuiOnly = True)
-                else:
-                    item.ResetSearchMatchBackgroundColor()
+        """ Search for a take right away, or once the current transaction commits. """
+        if self.IsInTransaction():
+            self.bTransactionSearch = True
             return
-        
-        # Filter the data based on the search text.
-        filtered_data = [take for take in System.Scene.Takes if text.lower() in take.Name.lower()]
-        non_matching_data = [take for take in System.Scene.Takes if take not in filtered_data]
-
-
-        for take in filtered_data:
-            if take is not None:
-                item = self.GetItemByTake(take)
-                item.SetSearchMatchBackgroundColor((10,60,10))
-        for take in non_matching_data:
-            if take is not None:
-                item = self.GetItemByTake(take)
-                if System.CurrentTake == take:
-                    item.SelectActiveTake(bUpdateGuiOnly = True)
-                else:
-                    item.ResetSearchMatchBackgroundColor()
+        self.CancelSearchPass()
+        for _ in self.IterateSearch(text, self.SearchGeneration):
+            pass
+
+
+    def IterateSearch(self, Text: str, Generation: int, bFocusBestMatch = False):
+        """
+        Find takes that match text, yielding after every slice. Stops if a newer search has started, otherwise the matches are applied in one batch.
+        Args:
+            bFocusBestMatch - Move the cursor to the best fuzzy match, only done when you are typing.
+        """
+        Matches: set[FBTake] = set()
+        RankedMatches: list[FBTake] = []
+        Query: TakeQuery.CompiledQuery = None
+        self.SearchBar.setToolTip(self.SEARCH_TOOLTIP)
+        if Text:
+            # Name index narrows down takes without reading any names from scene, the ones left only have to still exist.
+            if TakeQuery.IsQuery(Text):
+                Candidates, Query = self.FindQueryCandidates(Text)
+            elif self.bIsFuzzySearch:
+                Candidates = self.NameIndex.FindFuzzy(Text, self.FUZZY_SEARCH_LIMIT)
+            else:
+                Candidates = list(self.NameIndex.Find(Text))
+            for Start in range(0, len(Candidates), self.SEARCH_SLICE_SIZE):
+                for Take in Candidates[Start:Start + self.SEARCH_SLICE_SIZE]:
+                    if IsBound(Take) and (Query is None or Query(Take, self.QueryTable)):
+                        Matches.add(Take)
+                        RankedMatches.append(Take)
+                yield
+                if Generation != self.SearchGeneration:
+                    return
+        self.ApplySearchMatches(Matches)
+        if bFocusBestMatch and self.bIsFuzzySearch and RankedMatches:
+            self.FocusTake(RankedMatches[0])
+
+
+    def FindQueryCandidates(self, Text: str) -> tuple[list[FBTake], TakeQuery.CompiledQuery]:
+        """ Compile a query such as "color:red frames>300", and find the takes it has to be tested against. """
+        try:
+            Query = TakeQuery.CompileQuery(Text)
+        except TakeQuery.QueryError as Error:
+            # Show why nothing matches.
+            self.SearchBar.setToolTip(f"Invalid search: {Error}")
+            return [], None
+        # The current take is the one most likely to have been edited since its frames were read.
+        self.QueryTable.Forget(System.CurrentTake)
+        if not Query.NameTerms:
+            return list(self.NameIndex.NamesByKey), Query
+        # Plain text in query narrows down takes with the name index before testing.
+        Candidates = self.NameIndex.Find(Query.NameTerms[0])
+        for NameTerm in Query.NameTerms[1:]:
+            Candidates &= self.NameIndex.Find(NameTerm)
+        return list(Candidates), Query
+
+
+    def FocusTake(self, Take: FBTake):
+        """ Move the cursor to take and scroll to it, without changing the selection. """
+        Item = self.MaterializeItem(Take)
+        if Item is None:
+            return
+        self.TakeList.setCurrentItem(Item, 0, QtCore.QItemSelectionModel.NoUpdate)
+        self.TakeList.scrollToItem(Item)
+
+
+    def ApplySearchMatches(self, Matches: set[FBTake]):
+        """ Highlight takes that match your search. Only items whose match state changed are touched, and the list is repainted once. Highlights only live in the view, so nothing in scene is changed. """
+        StartTime = time.perf_counter()
+        StartWriteCount = MetadataStore.WriteCount
+        # Searches started by typing aren't deferred by transactions, repainting stays off if a transaction turned it off.
+        bWasUpdatesEnabled = self.TakeList.updatesEnabled()
+        self.TakeList.setUpdatesEnabled(False)
+        PreviousMatches = self.SearchMatches
+        for Take in PreviousMatches - Matches:
+            Item = self.GetItemByTake(Take)
+            if Item is not None:
+                Item.ResetSearchMatchBackgroundColor()
+        self.SearchMatches = Matches
+        for Take in Matches - PreviousMatches:
+            # Matches inside collapsed groups get their items created.
+            Item = self.MaterializeItem(Take)
+            if Item is not None:
+                Item.SetSearchMatchBackgroundColor(self.COLOR_SEARCH_MATCH)
+        self.UpdateFilter()
+        self.TakeList.setUpdatesEnabled(bWasUpdatesEnabled)
+        if DEBUG_REPORT_STATS:
+            ChangedCount = len(PreviousMatches ^ Matches)
+            ElapsedTime = (time.perf_counter() - StartTime) * 1000
+            print(f"{TOOL_NAME}: Search highlighted {len(Matches)} takes, {ChangedCount} changed, in {ElapsedTime:.2f} ms with {MetadataStore.WriteCount - StartWriteCount} metadata writes.")
+
+
+    def SetFilterMode(self, bIsFilterMode: bool):
+        """ Switch between highlighting matches and hiding takes that don't match. """
+        self.bIsFilterMode = bIsFilterMode
+        self.ActionFilterMode.setToolTip(f"Hide takes that don't match: {'On' if bIsFilterMode else 'Off'}")
+        bWasUpdatesEnabled = self.TakeList.updatesEnabled()
+        self.TakeList.setUpdatesEnabled(False)
+        self.UpdateFilter()
+        self.TakeList.setUpdatesEnabled(bWasUpdatesEnabled)
+
+
+    def UpdateFilter(self):
+        """ Hide takes that don't match your search while filtering, keeping groups of matches visible. Only items whose visibility changed are touched. """
+        VisibleTakes = None
+        if self.bIsFilterMode and self.SearchBar.text():
+            VisibleTakes = set()
+            for Take in self.SearchMatches:
+                # Stop at the first group that is already visible, the groups above it are as well.
+                while Take is not None and Take not in VisibleTakes:
+                    VisibleTakes.add(Take)
+                    Take = self.Hierarchy.GetParent(Take)
+        PreviousVisibleTakes = self.FilterVisibleTakes
+        self.FilterVisibleTakes = VisibleTakes
+        if VisibleTakes is None and PreviousVisibleTakes is None:
+            return
+        if VisibleTakes is None or PreviousVisibleTakes is None:
+            # Filter was turned on or off, every item may change.
+            self.ApplyFilterToItems(list(self.ItemsByTake.values()))
+        else:
+            ChangedItems = [self.ItemsByTake[Take] for Take in VisibleTakes ^ PreviousVisibleTakes if Take in self.ItemsByTake]
+            self.ApplyFilterToItems(ChangedItems)
+        # Matches inside collapsed groups would be hidden by the group, so the groups are expanded until filtering stops.
+        if VisibleTakes is None:
+            self.CollapseFilterExpandedGroups()
+        else:
+            self.ExpandGroupsOfTakes(VisibleTakes - (PreviousVisibleTakes or set()))
+
+
+    def ExpandGroupsOfTakes(self, Takes: set[FBTake]):
+        """ Expand every collapsed group that takes are inside of while filtering, creating their items if needed. Groups that were already visible are left as they are, in case they were collapsed by hand. """
+        GroupTakes = {self.Hierarchy.GetParent(Take) for Take in Takes}
+        GroupTakes.discard(None)
+        # Groups above come first, so the item of every group exists by the time it is expanded.
+        for Take in sorted(GroupTakes, key = self.Hierarchy.GetDepth):
+            Item = self.MaterializeItem(Take)
+            if Item is None or Item.isExpanded():
+                continue
+            self.FilterExpandedTakes.add(Take)
+            self.SetExpandedForFilter(Item, True)
+
+
+    def CollapseFilterExpandedGroups(self):
+        """ Collapse groups that were only expanded to show matches, once filtering stops. """
+        for Take in self.FilterExpandedTakes:
+            Item = self.ItemsByTake.get(Take)
+            if Item is not None:
+                self.SetExpandedForFilter(Item, False)
+        self.FilterExpandedTakes = set()
+
+
+    def IsHiddenByFilter(self, Take: FBTake) -> bool:
+        """ Check if take is hidden because it doesn't match your search. """
+        return self.FilterVisibleTakes is not None and Take not in self.FilterVisibleTakes
+
+
+    def ApplyFilterToItems(self, Items: list[TakeTreeItem]):
+        """ Show or hide items depending on the filter. Also used on items that were just added to list, as Qt only keeps hidden state of items that are in it. """
+        for Item in Items:
+            Item.setHidden(self.IsHiddenByFilter(Item.Take))
+
+
+    def RequestSearchRefresh(self):
+        """ Run search again once control returns to the event loop. Many requests in a row only run one search. """
+        if self.IsInTransaction():
+            self.bTransactionSearch = True
+            return
+        if self.SearchBar.text():
+            self.SearchRefreshTimer.start(0)
+
 
+    def RefreshSearch(self):
+        """ Run search again with the current search bar text. """
+        if self.SearchBar.text():
+            self.Search(self.SearchBar.text())
 
 
     def FocusOnSearch(self):
@@ -1671,6 +3553,37 @@ class NativeWidgetHolder(FBWidgetHolder):
 
 
 
+# ----------------- SCRIPTING ----------------- #
+
+
+
+def GetTakeManager() -> MainWidget:
+    """ Get the open Take Manager, or None if it isn't open. Found through the tool list, so it works no matter how this script was loaded. """
+    Tool = FBToolList.get(TOOL_NAME)
+    Widget = getattr(Tool, "QtToolWidget", None)
+    if Widget is None or not shiboken.isValid(Widget):
+        return None
+    return Widget
+
+
+@contextmanager
+def TakeTransaction():
+    """
+    Change many takes from a pipeline script as one batch, e.g:
+        with TakeManager.TakeTransaction():
+            for Take in Takes:
+                Take.Name = Take.Name.replace("Old", "New")
+    The list is updated once the batch is done. Does nothing extra if Take Manager isn't open. Gives the tool widget, or None.
+    """
+    Widget = GetTakeManager()
+    if Widget is None:
+        yield None
+        return
+    with Widget.Transaction():
+        yield Widget
+
+
+
 # ----------------- EXECUTE SCRIPT ----------------- #
 
 
@@ -0,0 +1,139 @@
+# pylint: disable-all
+
+from __future__ import annotations
+
+
+# Python [Utils Script] for MotionBuilder.
+# This script is used to validate and fix take names against the naming rules of the engine they are exported to.
+
+
+import re
+
+from functools import lru_cache
+
+
+
+
+
+
+# CONTENT:
+# NameRule
+# NameRuleSet
+# PRESETS
+
+
+
+
+
+
+# ----------------- NAME RULE ----------------- #
+
+
+
+class NameRule():
+    """ A single naming rule. The pattern matches the parts of a name that break the rule. """
+
+
+    def __init__(self, Name: str, InvalidPattern: str, Message: str, Replacement = ""):
+        """
+        Args:
+            Name - Name of rule, has to be a valid identifier.
+            InvalidPattern - Regular expression that matches the parts of a name that break the rule.
+            Message - Warning shown after the take name when the rule is broken.
+            Replacement - Text that replaces every broken part when names are fixed.
+        """
+        self.Name = Name
+        self.InvalidPattern = InvalidPattern
+        self.Message = Message
+        self.Replacement = Replacement
+
+
+
+# ----------------- NAME RULE SET ----------------- #
+
+
+
+class NameRuleSet():
+    """ Naming rules of one engine. All rules are compiled into a single pattern, so a name is scanned once no matter how many rules there are. """
+
+
+    def __init__(self, Name: str, MaxLength: int, Rules: list[NameRule], ExemptPrefixes: tuple[str, ...] = ()):
+        """
+        Args:
+            Name - Name of engine the rules belong to.
+            MaxLength - Max allowed length of characters in a take name.
+            Rules - Rules that every take name has to follow.
+            ExemptPrefixes - Take names that starts with these characters will always be valid.
+        """
+        self.Name = Name
+        self.MaxLength = MaxLength
+        self.Rules = Rules
+        self.ExemptPrefixes = ExemptPrefixes
+        self.RulesByName = {Rule.Name: Rule for Rule in Rules}
+        # Every rule is a named group, the group that matched tells which rule was broken.
+        self.Pattern = re.compile("|".join(f"(?P<{Rule.Name}>{Rule.InvalidPattern})" for Rule in Rules))
+        # Verdicts are cached per name, so takes sharing a name or renamed back and forth are only checked once.
+        self.GetWarnings = lru_cache(maxsize = 4096)(self.FindWarnings)
+        self.GetFixedName = lru_cache(maxsize = 4096)(self.FixName)
+
+
+    def IsExempt(self, TakeName: str) -> bool:
+        """ Check if take name is always valid. """
+        return bool(self.ExemptPrefixes) and TakeName.startswith(self.ExemptPrefixes)
+
+
+    def FindWarnings(self, TakeName: str) -> tuple[str, ...]:
+        """ Get warnings of take name, checking all rules in a single pass. Use the cached GetWarnings instead. """
+        if self.IsExempt(TakeName):
+            return ()
+        Warnings = []
+        # Report warning if full name is longer than max limit.
+        if len(TakeName) > self.MaxLength:
+            Warnings.append(f"{TakeName} - Name is too long!")
+        BrokenRules = {Match.lastgroup for Match in self.Pattern.finditer(TakeName)}
+        # Report warnings in the order rules were defined.
+        for Rule in self.Rules:
+            if Rule.Name in BrokenRules:
+                Warnings.append(f"{TakeName} - {Rule.Message}")
+        return tuple(Warnings)
+
+
+    def FixName(self, TakeName: str) -> str:
+        """ Get take name with every broken part replaced and cut to max length. Use the cached GetFixedName instead. """
+        if self.IsExempt(TakeName):
+            return TakeName
+        ReplaceBrokenParts = lambda Match: self.RulesByName[Match.lastgroup].Replacement
+        FixedName = self.Pattern.sub(ReplaceBrokenParts, TakeName)
+        # Cutting the name may break rules about how names end, so fix it once more.
+        if len(FixedName) > self.MaxLength:
+            FixedName = self.Pattern.sub(ReplaceBrokenParts, FixedName[:self.MaxLength])
+        return FixedName
+
+
+
+# ----------------- PRESETS ----------------- #
+
+
+
+# Characters that are replaced in invalid names.
+INVALID_CHARACTER_REPLACEMENT = "_"
+
+# Naming rules of every engine takes are exported to. The first one is used unless the scene picks another one.
+PRESETS: dict[str, NameRuleSet] = {
+    "Unreal Engine": NameRuleSet("Unreal Engine",
+        MaxLength = 160,
+        Rules = [
+            NameRule("InvalidCharacters", r"[^A-Za-z0-9_#=\s]+", "Contains invalid characters!", INVALID_CHARACTER_REPLACEMENT),
+        ],
+        ExemptPrefixes = ("=", "-"),
+    ),
+    "Unity": NameRuleSet("Unity",
+        MaxLength = 64,
+        Rules = [
+            NameRule("InvalidCharacters", r"[^A-Za-z0-9_\-\s]+", "Contains invalid characters!", INVALID_CHARACTER_REPLACEMENT),
+            NameRule("OuterWhitespace", r"^\s+|\s+$", "Starts or ends with whitespace!"),
+        ],
+        ExemptPrefixes = ("=", "-"),
+    ),
+}
+DEFAULT_PRESET_NAME = next(iter(PRESETS))
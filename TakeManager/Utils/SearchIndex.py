@@ -0,0 +1,310 @@
+# pylint: disable-all
+
+from __future__ import annotations
+
+
+# Python [Utils Script] for MotionBuilder.
+# This script is used to find takes by name without going through every take in scene.
+
+
+import re
+import heapq
+import itertools
+
+from collections import Counter
+
+
+
+
+
+
+# CONTENT:
+# GetWordStarts
+# ScoreFuzzyMatch
+# NameIndex
+
+
+
+
+
+
+# ----------------- FUZZY SCORING ----------------- #
+
+
+
+# Score of every matched character, and bonuses for where it was matched.
+FUZZY_SCORE_MATCH = 16
+FUZZY_BONUS_WORD_START = 8
+FUZZY_BONUS_CONSECUTIVE = 6
+FUZZY_BONUS_FIRST_CHARACTER = 8
+# Penalty of every character skipped between two matched characters.
+FUZZY_PENALTY_GAP = 1
+
+# Characters that separate words in names.
+WORD_SEPARATORS = " _-.#="
+
+
+def IsWordStart(Name: str, Index: int) -> bool:
+    """ Check if character starts a word, e.g. F in Walk_Forward or WalkForward, or 0 in Walk01. """
+    if Index == 0:
+        return True
+    Previous = Name[Index - 1]
+    Current = Name[Index]
+    if Previous in WORD_SEPARATORS:
+        return True
+    if Previous.islower() and Current.isupper():
+        return True
+    return Previous.isdigit() != Current.isdigit()
+
+
+def GetWordStarts(Name: str) -> frozenset[int]:
+    """ Get where words start in the normalized name, found on the name as it is shown. Lowercasing may turn one character into several, e.g. İ, so indexes are mapped over. """
+    WordStarts = set()
+    NormalizedIndex = 0
+    for Index, Character in enumerate(Name):
+        if IsWordStart(Name, Index):
+            WordStarts.add(NormalizedIndex)
+        NormalizedIndex += len(Character.lower())
+    return frozenset(WordStarts)
+
+
+def ScoreFuzzyMatch(NormalizedText: str, NormalizedName: str, WordStarts: frozenset[int]) -> int:
+    """
+    Score how well the characters of text match name in order, higher is better. Gives None if they don't.
+    Args:
+        NormalizedText - Characters to find, normalized the same way as name.
+        NormalizedName - Name to search in.
+        WordStarts - Indexes in normalized name where words start, from GetWordStarts.
+    """
+    # Find the earliest place where the last character can be matched.
+    End = -1
+    for Character in NormalizedText:
+        End = NormalizedName.find(Character, End + 1)
+        if End == -1:
+            return None
+    # Go back from there to find the shortest window that still holds every character.
+    Start = End + 1
+    for Character in reversed(NormalizedText):
+        Start = NormalizedName.rfind(Character, 0, Start)
+    # Score characters matched from the start of the window.
+    Score = 0
+    Index = Start - 1
+    PreviousIndex = None
+    for Character in NormalizedText:
+        Index = NormalizedName.find(Character, Index + 1)
+        Score += FUZZY_SCORE_MATCH
+        if Index in WordStarts:
+            Score += FUZZY_BONUS_WORD_START
+            if PreviousIndex is None:
+                Score += FUZZY_BONUS_FIRST_CHARACTER
+        if PreviousIndex is not None:
+            if Index == PreviousIndex + 1:
+                Score += FUZZY_BONUS_CONSECUTIVE
+            else:
+                Score -= FUZZY_PENALTY_GAP * (Index - PreviousIndex - 1)
+        PreviousIndex = Index
+    return Score
+
+
+
+# ----------------- NAME INDEX ----------------- #
+
+
+
+class NameIndex():
+    """
+    Trigram index over normalized names. Every 3 character slice of a name points at the keys whose name contains it.
+    Substring queries intersect the keys of their trigrams instead of checking every name, and names are only normalized once when added.
+    """
+
+
+    # Length of the slices names are indexed by. Queries shorter than this are checked against every name.
+    GRAM_LENGTH = 3
+
+    # Max number of names a fuzzy search scores. Past it, names holding the most slices of the text as is are scored first.
+    FUZZY_SCORE_LIMIT = 1000
+
+
+    def __init__(self):
+        self.NamesByKey: dict = {}
+        self.NormalizedNamesByKey: dict = {}
+        self.KeysByGram: dict[str, set] = {}
+        # Keys by every character their name contains, used to narrow down fuzzy searches.
+        self.KeysByCharacter: dict[str, set] = {}
+        # Where words start in every normalized name, only found once a name is scored by a fuzzy search.
+        self.WordStartsByKey: dict = {}
+        # Keys that matched the last fuzzy search. Typing more characters can only narrow these down further.
+        self.LastFuzzyText = None
+        self.LastFuzzyKeys: set = None
+
+
+    def __contains__(self, Key) -> bool:
+        return Key in self.NormalizedNamesByKey
+
+
+    def __len__(self) -> int:
+        return len(self.NormalizedNamesByKey)
+
+
+    @staticmethod
+    def Normalize(Name: str) -> str:
+        """ Get name in the form it is indexed and searched by. """
+        return Name.lower()
+
+
+    @classmethod
+    def GetGrams(cls, NormalizedName: str) -> set[str]:
+        """ Get every slice of name that is indexed. """
+        return {NormalizedName[Index:Index + cls.GRAM_LENGTH] for Index in range(len(NormalizedName) - cls.GRAM_LENGTH + 1)}
+
+
+    def Clear(self):
+        """ Forget all names. """
+        self.NamesByKey = {}
+        self.NormalizedNamesByKey = {}
+        self.KeysByGram = {}
+        self.KeysByCharacter = {}
+        self.WordStartsByKey = {}
+        self.LastFuzzyText = None
+        self.LastFuzzyKeys = None
+
+
+    def Rebuild(self, NamesByKey: dict):
+        """ Index names from scratch. """
+        self.Clear()
+        for Key, Name in NamesByKey.items():
+            self.Add(Key, Name)
+
+
+    def Add(self, Key, Name: str):
+        """ Index name of key. Also used when key is renamed, only the slices that changed are updated. """
+        if self.NamesByKey.get(Key) == Name:
+            return
+        NormalizedName = self.Normalize(Name)
+        PreviousName = self.NormalizedNamesByKey.get(Key, "")
+        PreviousGrams = self.GetGrams(PreviousName)
+        Grams = self.GetGrams(NormalizedName)
+        for Gram in PreviousGrams - Grams:
+            self.RemoveFromSlice(self.KeysByGram, Gram, Key)
+        for Gram in Grams - PreviousGrams:
+            self.KeysByGram.setdefault(Gram, set()).add(Key)
+        PreviousCharacters = set(PreviousName)
+        Characters = set(NormalizedName)
+        for Character in PreviousCharacters - Characters:
+            self.RemoveFromSlice(self.KeysByCharacter, Character, Key)
+        for Character in Characters - PreviousCharacters:
+            self.KeysByCharacter.setdefault(Character, set()).add(Key)
+        self.NamesByKey[Key] = Name
+        self.NormalizedNamesByKey[Key] = NormalizedName
+        self.WordStartsByKey.pop(Key, None)
+        self.LastFuzzyText = None
+
+
+    def Remove(self, Key):
+        """ Remove key from index. Uses the name it was indexed with, so it works even if the take has already been deleted. """
+        NormalizedName = self.NormalizedNamesByKey.pop(Key, None)
+        if NormalizedName is None:
+            return
+        del self.NamesByKey[Key]
+        self.WordStartsByKey.pop(Key, None)
+        for Gram in self.GetGrams(NormalizedName):
+            self.RemoveFromSlice(self.KeysByGram, Gram, Key)
+        for Character in set(NormalizedName):
+            self.RemoveFromSlice(self.KeysByCharacter, Character, Key)
+        self.LastFuzzyText = None
+
+
+    @staticmethod
+    def RemoveFromSlice(KeysBySlice: dict[str, set], Slice: str, Key):
+        """ Remove key from the keys of a slice, dropping slices no name contains anymore. """
+        Keys = KeysBySlice.get(Slice)
+        if Keys is None:
+            return
+        Keys.discard(Key)
+        if not Keys:
+            del KeysBySlice[Slice]
+
+
+    def Find(self, Text: str) -> set:
+        """ Get keys whose name contains text, ignoring case. """
+        NormalizedText = self.Normalize(Text)
+        if not NormalizedText:
+            return set()
+        # Too short to have any slices, check every name that is already normalized.
+        if len(NormalizedText) < self.GRAM_LENGTH:
+            return {Key for Key, Name in self.NormalizedNamesByKey.items() if NormalizedText in Name}
+        # Intersect starting from the slice with the fewest keys, so every step is as small as possible.
+        KeySets = []
+        for Gram in self.GetGrams(NormalizedText):
+            Keys = self.KeysByGram.get(Gram)
+            if not Keys:
+                return set()
+            KeySets.append(Keys)
+        KeySets.sort(key = len)
+        Candidates = set(KeySets[0])
+        for Keys in KeySets[1:]:
+            Candidates &= Keys
+            if not Candidates:
+                return Candidates
+        # Sharing every slice doesn't mean the slices are in the same order, so check the candidates that are left.
+        if len(NormalizedText) == self.GRAM_LENGTH:
+            return Candidates
+        return {Key for Key in Candidates if NormalizedText in self.NormalizedNamesByKey[Key]}
+
+
+    def FindFuzzy(self, Text: str, Limit: int) -> list:
+        """
+        Get keys whose name contains the characters of text in order, best match first. Whitespace in text is ignored.
+        Args:
+            Text - Characters to find, e.g. wlkfwd finds Walk_Forward.
+            Limit - Max number of keys to give.
+        """
+        NormalizedText = "".join(self.Normalize(Text).split())
+        if not NormalizedText:
+            return []
+        # Keys from the last search can be narrowed down further if more characters were only typed at the end.
+        if self.LastFuzzyText is not None and NormalizedText.startswith(self.LastFuzzyText):
+            Candidates = self.LastFuzzyKeys
+        else:
+            # Name has to contain every character of text, intersect starting from the rarest one.
+            KeySets = []
+            for Character in set(NormalizedText):
+                Keys = self.KeysByCharacter.get(Character)
+                if not Keys:
+                    return []
+                KeySets.append(Keys)
+            KeySets.sort(key = len)
+            Candidates = set(KeySets[0])
+            for Keys in KeySets[1:]:
+                Candidates &= Keys
+        # Reject names where the characters aren't in order with a compiled pattern, before scoring what's left in Python.
+        OrderPattern = re.compile(".*?".join(re.escape(Character) for Character in NormalizedText))
+        Keys = {Key for Key in Candidates if OrderPattern.search(self.NormalizedNamesByKey[Key])}
+        self.LastFuzzyText = NormalizedText
+        self.LastFuzzyKeys = Keys
+        ScoredKeys = []
+        for Key in self.GetFuzzyKeysToScore(NormalizedText, Keys):
+            WordStarts = self.WordStartsByKey.get(Key)
+            if WordStarts is None:
+                WordStarts = self.WordStartsByKey[Key] = GetWordStarts(self.NamesByKey[Key])
+            Score = ScoreFuzzyMatch(NormalizedText, self.NormalizedNamesByKey[Key], WordStarts)
+            # Shorter names win when scores are equal.
+            ScoredKeys.append((Score, -len(self.NamesByKey[Key]), id(Key), Key))
+        return [ScoredKey[-1] for ScoredKey in heapq.nlargest(Limit, ScoredKeys)]
+
+
+    def GetFuzzyKeysToScore(self, NormalizedText: str, Keys: set):
+        """ Get at most FUZZY_SCORE_LIMIT of the keys to score. Names holding runs of the text as is score highest, so keys are ranked by how many slices of the text their name has. """
+        if len(Keys) <= self.FUZZY_SCORE_LIMIT:
+            return Keys
+        # Counted from the slice index, so only names holding a slice are gone through.
+        SliceCounts = Counter()
+        for Gram in self.GetGrams(NormalizedText):
+            GramKeys = self.KeysByGram.get(Gram)
+            if GramKeys:
+                SliceCounts.update(GramKeys & Keys)
+        KeysToScore = [Key for Key, Count in SliceCounts.most_common(self.FUZZY_SCORE_LIMIT)]
+        # Fill up with names that have no slice of the text, e.g. when it is too short to have any.
+        if len(KeysToScore) < self.FUZZY_SCORE_LIMIT:
+            KeysToScore.extend(itertools.islice((Key for Key in Keys if Key not in SliceCounts), self.FUZZY_SCORE_LIMIT - len(KeysToScore)))
+        return KeysToScore
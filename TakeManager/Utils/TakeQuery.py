@@ -0,0 +1,169 @@
+# pylint: disable-all
+
+from __future__ import annotations
+
+
+# Python [Utils Script] for MotionBuilder.
+# This script is used to parse search bar queries such as "color:red group:Locomotion frames>300" into a test that is run on every take.
+
+
+import re
+import fnmatch
+
+from functools import lru_cache
+
+
+
+
+
+
+# CONTENT:
+# QueryError
+# CompiledQuery
+# IsQuery
+# CompileQuery
+
+
+
+
+
+
+# ----------------- ERRORS ----------------- #
+
+
+
+class QueryError(ValueError):
+    """ Raised when a query can't be parsed. """
+
+
+
+# ----------------- QUERY PARSING ----------------- #
+
+
+
+# A term is an optional "-" to negate it, an optional key and operator, and a value that may be quoted to hold whitespace.
+TERM_PATTERN = re.compile(r'(?P<Negate>-)?(?:(?P<Key>[A-Za-z]+)(?P<Operator>>=|<=|:|>|<|=))?(?P<Value>"[^"]*"?|\S+)')
+
+# Keys that compare text, and keys that compare numbers.
+TEXT_KEYS = ("name", "color", "group", "invalid")
+NUMBER_KEYS = ("len", "frames")
+
+NUMBER_OPERATORS = {
+    ":": lambda Value, Limit: Value == Limit,
+    "=": lambda Value, Limit: Value == Limit,
+    ">": lambda Value, Limit: Value > Limit,
+    "<": lambda Value, Limit: Value < Limit,
+    ">=": lambda Value, Limit: Value >= Limit,
+    "<=": lambda Value, Limit: Value <= Limit,
+}
+
+BOOLEAN_VALUES = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+def IsQuery(Text: str) -> bool:
+    """ Check if text uses any query keys or excludes a term, e.g. "walk -run", otherwise it is searched as a plain name. """
+    for Match in TERM_PATTERN.finditer(Text):
+        if Match.group("Key") and Match.group("Key").lower() in TEXT_KEYS + NUMBER_KEYS:
+            return True
+        if Match.group("Negate") and Match.group("Value").strip('"'):
+            return True
+    return False
+
+
+def CompileTextMatcher(Value: str):
+    """ Get test of lowercase text. Values with * or ? are wildcards matching the whole text, others match any part of it. """
+    if "*" in Value or "?" in Value:
+        return re.compile(fnmatch.translate(Value)).match
+    return lambda Text: Value in Text
+
+
+def CompileTerm(Key: str, Operator: str, Value: str):
+    """ Get test of a single term, taking a take and the table holding its values. """
+    if Key in NUMBER_KEYS:
+        try:
+            Limit = int(Value)
+        except ValueError:
+            raise QueryError(f"{Key} needs a whole number, got: {Value}")
+        Compare = NUMBER_OPERATORS[Operator]
+        if Key == "len":
+            return lambda Take, Table: Compare(len(Table.GetName(Take)), Limit)
+        return lambda Take, Table: Compare(Table.GetFrames(Take), Limit)
+    if Operator != ":":
+        raise QueryError(f"{Key} can only be compared with ':'")
+    if Key == "invalid":
+        if Value not in BOOLEAN_VALUES:
+            raise QueryError(f"invalid needs true or false, got: {Value}")
+        bIsInvalid = BOOLEAN_VALUES[Value]
+        return lambda Take, Table: Table.IsInvalid(Take) == bIsInvalid
+    if Key == "color":
+        return lambda Take, Table: Table.GetColorName(Take) == Value
+    Matches = CompileTextMatcher(Value)
+    if Key == "group":
+        return lambda Take, Table: any(Matches(GroupName) for GroupName in Table.GetGroupNames(Take))
+    return lambda Take, Table: bool(Matches(Table.GetName(Take)))
+
+
+
+# ----------------- COMPILED QUERY ----------------- #
+
+
+
+class CompiledQuery():
+    """
+    Query parsed into tests that every matching take has to pass.
+    Takes are tested against a table of their values, which the tool provides from its own indexes instead of the scene. It needs:
+        GetName(Take) - Lowercase name of take.
+        GetColorName(Take) - Lowercase name of the color of take, "none" if it has no color.
+        GetGroupNames(Take) - Lowercase names of every group take is inside of, closest first.
+        IsInvalid(Take) - True if name of take has any warnings.
+        GetFrames(Take) - Number of frames in take.
+    """
+
+
+    def __init__(self, Tests: list, NameTerms: list[str]):
+        """
+        Args:
+            Tests - Tests taking a take and the table holding its values.
+            NameTerms - Plain text every matching name contains, used to narrow down takes with the name index before testing.
+        """
+        self.Tests = Tests
+        self.NameTerms = NameTerms
+
+
+    def __call__(self, Take, Table) -> bool:
+        """ Check if take matches query. """
+        for Test in self.Tests:
+            if not Test(Take, Table):
+                return False
+        return True
+
+
+@lru_cache(maxsize = 256)
+def CompileQuery(Text: str) -> CompiledQuery:
+    """ Parse query into tests. Queries are cached, so typing back and forth or searching again doesn't parse them again. """
+    Tests = []
+    NameTerms = []
+    for Match in TERM_PATTERN.finditer(Text.lower()):
+        bNegate = bool(Match.group("Negate"))
+        Key = Match.group("Key")
+        Operator = Match.group("Operator")
+        Value = Match.group("Value").strip('"')
+        # Keys that aren't known are part of the value, e.g. a name containing ':'.
+        if Key and Key not in TEXT_KEYS + NUMBER_KEYS:
+            Value = Key + Operator + Value
+            Key = None
+        if not Value:
+            raise QueryError(f"{Key or 'name'} is missing a value")
+        if Key is None:
+            Key = "name"
+            Operator = ":"
+            # Plain text can be looked up in the name index.
+            if not bNegate and "*" not in Value and "?" not in Value:
+                NameTerms.append(Value)
+        Test = CompileTerm(Key, Operator, Value)
+        if bNegate:
+            Test = lambda Take, Table, Test = Test: not Test(Take, Table)
+        Tests.append((Key == "frames", Test))
+    # Cheapest tests first, frames may have to be read from scene the first time.
+    Tests.sort(key = lambda KeyAndTest: KeyAndTest[0])
+    return CompiledQuery([Test for bReadsScene, Test in Tests], NameTerms)
@@ -0,0 +1,173 @@
+# pylint: disable-all
+
+from __future__ import annotations
+
+
+# Python [Utils Script] for MotionBuilder.
+# This script is used to run long operations in small time slices between UI events, showing progress and letting them be cancelled.
+
+
+import time
+
+from PySide2 import QtCore, QtWidgets
+from PySide2.QtCore import QTimer
+
+
+
+
+
+
+# CONTENT:
+# SlicedTask
+
+
+
+
+
+
+# ----------------- SLICED TASK ----------------- #
+
+
+
+class SlicedTask():
+    """
+    Runs the steps of a generator in slices that each fit a time budget, returning to the event loop between slices so MotionBuilder stays responsive.
+    The generator yields once after every step. Cancelling closes it, so it can finish what it has done so far inside a finally block.
+    """
+
+
+    def __init__(self, Parent: QtWidgets.QWidget, Title: str, Steps, NumberOfSteps: int, OnFinished = None, TimeBudget = 30, ProgressDelay = 500):
+        """
+        Args:
+            Parent - Widget the progress popup is shown over.
+            Title - Title of the progress popup, e.g. "Duplicating Takes".
+            Steps - Generator doing one step at a time. It may yield a text describing the step it just did.
+            NumberOfSteps - Number of steps the generator is expected to yield, used for progress and time left.
+            OnFinished - Called with the task once all steps are done or it was cancelled.
+            TimeBudget - Time in milliseconds that steps may run before returning to the event loop.
+            ProgressDelay - Time in milliseconds before the progress popup is shown, so short tasks never show it.
+        """
+        self.Parent = Parent
+        self.Title = Title
+        self.Steps = Steps
+        self.NumberOfSteps = max(NumberOfSteps, 1)
+        self.OnFinished = OnFinished
+        self.TimeBudget = TimeBudget / 1000
+        self.ProgressDelay = ProgressDelay / 1000
+        # Progress.
+        self.NumberOfStepsDone = 0
+        self.bIsRunning = False
+        self.bIsCancelled = False
+        self.ProgressPopup: QtWidgets.QProgressDialog = None
+        # Timing of every step, and of the slowest one.
+        self.StepTimes: list[float] = []
+        self.TotalStepTime = 0.0
+        self.SlowestStep = (0.0, None)
+        self.NumberOfSlices = 0
+        self.StartTime = 0.0
+        self.EndTime = 0.0
+        # (Call function) Run next slice once control has returned to the event loop.
+        self.SliceTimer = QTimer()
+        self.SliceTimer.setSingleShot(True)
+        self.SliceTimer.timeout.connect(self.RunSlice)
+
+
+    def Start(self):
+        """ Run the first slice right away. Steps that fit in it never wait for the event loop. """
+        self.bIsRunning = True
+        self.StartTime = time.perf_counter()
+        self.RunSlice()
+
+
+    def Cancel(self):
+        """ Stop after the step that is currently running. Steps already done are kept. """
+        if not self.bIsRunning:
+            return
+        self.bIsCancelled = True
+        self.SliceTimer.stop()
+        # Generator finishes what it has done so far.
+        self.Steps.close()
+        self.Finish()
+
+
+    def RunSlice(self):
+        """ Run steps until the time budget is used up, then continue once control returns to the event loop. """
+        if not self.bIsRunning:
+            return
+        self.NumberOfSlices += 1
+        SliceStartTime = time.perf_counter()
+        StepStartTime = SliceStartTime
+        while StepStartTime - SliceStartTime < self.TimeBudget:
+            try:
+                StepName = next(self.Steps)
+            except StopIteration:
+                self.Finish()
+                return
+            except Exception:
+                self.bIsCancelled = True
+                self.Finish()
+                raise
+            StepEndTime = time.perf_counter()
+            StepTime = StepEndTime - StepStartTime
+            self.StepTimes.append(StepTime)
+            self.TotalStepTime += StepTime
+            if StepTime > self.SlowestStep[0]:
+                self.SlowestStep = (StepTime, StepName)
+            self.NumberOfStepsDone += 1
+            StepStartTime = StepEndTime
+        self.UpdateProgress()
+        if self.bIsRunning:
+            self.SliceTimer.start(0)
+
+
+    def GetTimeLeft(self) -> float:
+        """ Get estimated time left in seconds, from the average time of steps done so far. """
+        if not self.StepTimes:
+            return 0.0
+        NumberOfStepsLeft = max(self.NumberOfSteps - self.NumberOfStepsDone, 0)
+        return self.TotalStepTime / len(self.StepTimes) * NumberOfStepsLeft
+
+
+    def UpdateProgress(self):
+        """ Show progress and time left, once the task has run longer than the progress delay. """
+        if self.ProgressPopup is None:
+            if time.perf_counter() - self.StartTime < self.ProgressDelay:
+                return
+            self.ProgressPopup = QtWidgets.QProgressDialog(self.Title, "Cancel", 0, self.NumberOfSteps, self.Parent)
+            self.ProgressPopup.setWindowTitle(self.Title)
+            self.ProgressPopup.setWindowModality(QtCore.Qt.WindowModal)
+            self.ProgressPopup.setMinimumDuration(0)
+            self.ProgressPopup.setAutoClose(False)
+            self.ProgressPopup.setAutoReset(False)
+            # (Call function) Stop task when cancel is clicked or popup is closed.
+            self.ProgressPopup.canceled.connect(self.Cancel)
+        self.ProgressPopup.setLabelText(f"{self.Title} {self.NumberOfStepsDone} / {self.NumberOfSteps}, about {self.GetTimeLeft():.0f} s left.")
+        # Popup handles events while setting its value, cancel may be clicked in the meantime.
+        self.ProgressPopup.setValue(min(self.NumberOfStepsDone, self.NumberOfSteps))
+
+
+    def Finish(self):
+        """ Close progress popup and report that the task is done. """
+        self.bIsRunning = False
+        self.EndTime = time.perf_counter()
+        if self.ProgressPopup is not None:
+            # Closing the popup would otherwise report a cancel.
+            self.ProgressPopup.canceled.disconnect(self.Cancel)
+            self.ProgressPopup.close()
+            self.ProgressPopup.deleteLater()
+            self.ProgressPopup = None
+        if self.OnFinished is not None:
+            self.OnFinished(self)
+
+
+    def GetReport(self) -> str:
+        """ Get summary of how many steps were done, and how long they took. """
+        TotalTime = (self.EndTime - self.StartTime) * 1000
+        StepTime = self.TotalStepTime * 1000
+        AverageTime = StepTime / len(self.StepTimes) if self.StepTimes else 0.0
+        SlowestTime, SlowestName = self.SlowestStep
+        Report = f"{self.Title} {'cancelled' if self.bIsCancelled else 'done'} after {self.NumberOfStepsDone} / {self.NumberOfSteps} steps in {TotalTime:.2f} ms over {self.NumberOfSlices} slices."
+        Report += f" Steps took {StepTime:.2f} ms, {AverageTime:.2f} ms on average, slowest {SlowestTime * 1000:.2f} ms"
+        if SlowestName is not None:
+            Report += f" ({SlowestName})"
+        return Report + "."
@@ -0,0 +1,11 @@
+# Tests of the Utils scripts that don't depend on MotionBuilder.
+# Utils scripts are imported on their own, the way the tool imports them inside MotionBuilder, as importing the TakeManager package needs pyfbsdk.
+
+
+import os
+import sys
+
+
+UTILS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TakeManager", "Utils")
+if UTILS_DIRECTORY not in sys.path:
+    sys.path.insert(0, UTILS_DIRECTORY)
@@ -0,0 +1,66 @@
+import random
+import unittest
+
+import NameValidation
+
+
+
+class NameRuleSetTest(unittest.TestCase):
+    """ Naming rules of every preset, and names fixed by them. """
+
+
+    def testValidNameHasNoWarnings(self):
+        for RuleSet in NameValidation.PRESETS.values():
+            self.assertEqual(RuleSet.GetWarnings("Walk_Forward_01"), ())
+
+
+    def testInvalidCharactersAreReported(self):
+        for RuleSet in NameValidation.PRESETS.values():
+            Warnings = RuleSet.GetWarnings("Walk!Forward")
+            self.assertEqual(len(Warnings), 1)
+            self.assertIn("invalid characters", Warnings[0])
+
+
+    def testTooLongNameIsReported(self):
+        for RuleSet in NameValidation.PRESETS.values():
+            Warnings = RuleSet.GetWarnings("a" * (RuleSet.MaxLength + 1))
+            self.assertEqual(len(Warnings), 1)
+            self.assertIn("too long", Warnings[0])
+            self.assertEqual(RuleSet.GetWarnings("a" * RuleSet.MaxLength), ())
+
+
+    def testExemptPrefixesAreAlwaysValid(self):
+        for RuleSet in NameValidation.PRESETS.values():
+            for Prefix in RuleSet.ExemptPrefixes:
+                self.assertEqual(RuleSet.GetWarnings(Prefix + "!!" + "a" * (RuleSet.MaxLength + 1)), ())
+
+
+    def testEveryRuleIsReportedInOrder(self):
+        RuleSet = NameValidation.PRESETS["Unity"]
+        Warnings = RuleSet.GetWarnings(" Walk!")
+        self.assertEqual([Warning.split(" - ", 1)[1] for Warning in Warnings], [Rule.Message for Rule in RuleSet.Rules])
+
+
+    def testFixedNamesValidateClean(self):
+        """ Auto fix has to give names that pass the rules they were fixed by, for every preset. """
+        Characters = "abcXYZ019_#= -\t.!éİß/"
+        Random = random.Random(0)
+        for RuleSet in NameValidation.PRESETS.values():
+            for _ in range(2000):
+                Name = "".join(Random.choice(Characters) for _ in range(Random.randint(0, RuleSet.MaxLength + 40)))
+                FixedName = RuleSet.GetFixedName(Name)
+                self.assertEqual(RuleSet.GetWarnings(FixedName), (), f"{RuleSet.Name}: {Name!r} was fixed to {FixedName!r}")
+
+
+    def testValidNamesAreNotChanged(self):
+        for RuleSet in NameValidation.PRESETS.values():
+            self.assertEqual(RuleSet.GetFixedName("Walk_Forward_01"), "Walk_Forward_01")
+
+
+    def testDefaultPresetExists(self):
+        self.assertIn(NameValidation.DEFAULT_PRESET_NAME, NameValidation.PRESETS)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
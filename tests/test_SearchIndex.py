@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+
+import random
+import unittest
+
+import SearchIndex
+
+
+
+def CreateRandomNames(Random: random.Random, NumberOfNames: int) -> dict[int, str]:
+    """ Get random names by key, made of few characters so they share many slices. """
+    Characters = "abcAB_ 1İ"
+    return {Key: "".join(Random.choice(Characters) for _ in range(Random.randint(0, 12))) for Key in range(NumberOfNames)}
+
+
+def FindByScan(NamesByKey: dict[int, str], Text: str) -> set[int]:
+    """ Get keys whose name contains text, by checking every name. """
+    NormalizedText = Text.lower()
+    if not NormalizedText:
+        return set()
+    return {Key for Key, Name in NamesByKey.items() if NormalizedText in Name.lower()}
+
+
+
+class NameIndexFindTest(unittest.TestCase):
+    """ Substring search over the trigram index, compared against checking every name. """
+
+
+    def setUp(self):
+        self.Random = random.Random(0)
+        self.NamesByKey = CreateRandomNames(self.Random, 500)
+        self.Index = SearchIndex.NameIndex()
+        self.Index.Rebuild(self.NamesByKey)
+
+
+    def AssertMatchesScan(self):
+        for Text in ["a", "b_", "ab", "aba", "abc", "ab_a", "B A", "1i", "i̇", "zzz", "", "ABAB"]:
+            self.assertEqual(self.Index.Find(Text), FindByScan(self.NamesByKey, Text), Text)
+        for _ in range(200):
+            Name = self.Random.choice(list(self.NamesByKey.values()))
+            Start = self.Random.randint(0, len(Name))
+            Text = Name[Start:Start + self.Random.randint(1, 6)]
+            self.assertEqual(self.Index.Find(Text), FindByScan(self.NamesByKey, Text), Text)
+
+
+    def testFindMatchesScan(self):
+        self.AssertMatchesScan()
+
+
+    def testFindMatchesScanAfterRenamesAndRemoves(self):
+        for Key in self.Random.sample(list(self.NamesByKey), 150):
+            self.NamesByKey[Key] = CreateRandomNames(self.Random, 1)[0]
+            self.Index.Add(Key, self.NamesByKey[Key])
+        for Key in self.Random.sample(list(self.NamesByKey), 150):
+            del self.NamesByKey[Key]
+            self.Index.Remove(Key)
+        self.assertEqual(len(self.Index), len(self.NamesByKey))
+        self.AssertMatchesScan()
+
+
+    def testFindIgnoresCase(self):
+        Index = SearchIndex.NameIndex()
+        Index.Add("Walk", "Walk_Forward_01")
+        self.assertEqual(Index.Find("FORWARD"), {"Walk"})
+        self.assertEqual(Index.Find("forward_01"), {"Walk"})
+
+
+    def testRemovedSlicesAreDropped(self):
+        Index = SearchIndex.NameIndex()
+        Index.Add(1, "walk")
+        Index.Add(1, "run")
+        Index.Remove(1)
+        self.assertEqual(Index.KeysByGram, {})
+        self.assertEqual(Index.KeysByCharacter, {})
+        self.assertEqual(Index.Find("walk"), set())
+
+
+
+def IsSubsequence(Text: str, Name: str) -> bool:
+    """ Check if characters of text are in name in order. """
+    Characters = iter(Name)
+    return all(Character in Characters for Character in Text)
+
+
+
+class NameIndexFindFuzzyTest(unittest.TestCase):
+    """ Fuzzy search ranking, and the candidates it is allowed to skip. """
+
+
+    def setUp(self):
+        self.Index = SearchIndex.NameIndex()
+        for Name in ["Walk_Forward_01", "Idle_Look_Around", "walk_fwd", "Swalkfwd", "WalkForward", "Run_Forward", "xwxlxkxfxwxd"]:
+            self.Index.Add(Name, Name)
+
+
+    def testOnlyNamesHoldingCharactersInOrderMatch(self):
+        Matches = self.Index.FindFuzzy("wlkfwd", 10)
+        self.assertEqual(set(Matches), {Name for Name in self.Index.NamesByKey if IsSubsequence("wlkfwd", Name.lower())})
+        self.assertNotIn("Run_Forward", Matches)
+
+
+    def testWordStartsAndRunsRankFirst(self):
+        Matches = self.Index.FindFuzzy("wlkfwd", 10)
+        # Characters spread over a single word, and characters that are never at a word start, rank last.
+        self.assertEqual(Matches[-2:], ["Swalkfwd", "xwxlxkxfxwxd"])
+        self.assertLess(Matches.index("WalkForward"), Matches.index("Swalkfwd"))
+        self.assertEqual(self.Index.FindFuzzy("walk", 10)[0], "walk_fwd")
+
+
+    def testShorterNameWinsTie(self):
+        Index = SearchIndex.NameIndex()
+        Index.Add("Long", "Walk_Forward_Long")
+        Index.Add("Short", "Walk_Forward")
+        self.assertEqual(Index.FindFuzzy("walk", 10), ["Short", "Long"])
+
+
+    def testLimitAndWhitespace(self):
+        self.assertEqual(len(self.Index.FindFuzzy("wlkfwd", 2)), 2)
+        self.assertEqual(self.Index.FindFuzzy("w l k f w d", 10), self.Index.FindFuzzy("wlkfwd", 10))
+        self.assertEqual(self.Index.FindFuzzy("", 10), [])
+        self.assertEqual(self.Index.FindFuzzy("qqq", 10), [])
+
+
+    def testTypingMoreMatchesFreshSearch(self):
+        """ Typing more characters narrows down the last matches, which has to give the same result as searching from scratch. """
+        Random = random.Random(1)
+        NamesByKey = CreateRandomNames(Random, 300)
+        Index = SearchIndex.NameIndex()
+        Index.Rebuild(NamesByKey)
+        for Text in ["a", "ab", "ab_", "ab_b", "ab_b1"]:
+            Typed = Index.FindFuzzy(Text, 1000)
+            Fresh = SearchIndex.NameIndex()
+            Fresh.Rebuild(NamesByKey)
+            self.assertEqual(Typed, Fresh.FindFuzzy(Text, 1000), Text)
+            self.assertEqual(set(Typed), {Key for Key, Name in NamesByKey.items() if IsSubsequence(Text, Name.lower())}, Text)
+
+
+    def testScoreLimitKeepsNamesHoldingTheText(self):
+        Index = SearchIndex.NameIndex()
+        Index.FUZZY_SCORE_LIMIT = 10
+        for Key in range(100):
+            Index.Add(Key, f"w_x_a_x_l_x_k_{Key}")
+        Index.Add("Walk", "Walk")
+        self.assertEqual(Index.FindFuzzy("walk", 1), ["Walk"])
+
+
+
+class WordStartsTest(unittest.TestCase):
+    """ Word starts are indexes into the normalized name. """
+
+
+    def testWordStarts(self):
+        self.assertEqual(SearchIndex.GetWordStarts("WalkForward01"), {0, 4, 11})
+        self.assertEqual(SearchIndex.GetWordStarts("walk fwd"), {0, 5})
+        self.assertEqual(SearchIndex.GetWordStarts(""), set())
+
+
+    def testCharactersThatLowercaseLongerKeepIndexesAligned(self):
+        Name = "İdle_Walk"
+        NormalizedName = SearchIndex.NameIndex.Normalize(Name)
+        WordStarts = SearchIndex.GetWordStarts(Name)
+        self.assertEqual(WordStarts, {0, 6})
+        self.assertEqual(NormalizedName[6], "w")
+        self.assertIsNotNone(SearchIndex.ScoreFuzzyMatch("walk", NormalizedName, WordStarts))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
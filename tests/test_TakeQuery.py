@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+
+import unittest
+
+import TakeQuery
+
+
+
+class FakeTable():
+    """ Table of take values, holding them by take name instead of reading them from the scene. """
+
+
+    def __init__(self, ValuesByTake: dict[str, dict]):
+        self.ValuesByTake = ValuesByTake
+
+
+    def GetName(self, Take: str) -> str:
+        return Take.lower()
+
+
+    def GetColorName(self, Take: str) -> str:
+        return self.ValuesByTake[Take].get("Color", "none")
+
+
+    def GetGroupNames(self, Take: str) -> list[str]:
+        return self.ValuesByTake[Take].get("Groups", [])
+
+
+    def IsInvalid(self, Take: str) -> bool:
+        return self.ValuesByTake[Take].get("bIsInvalid", False)
+
+
+    def GetFrames(self, Take: str) -> int:
+        return self.ValuesByTake[Take].get("Frames", 0)
+
+
+
+class IsQueryTest(unittest.TestCase):
+    """ Text is only parsed as a query if it uses a known key or excludes a term. """
+
+
+    def testPlainNamesAreNotQueries(self):
+        for Text in ["walk", "walk_forward", "walk-run", "walk - run", "-\"\"", "take:01", ""]:
+            self.assertFalse(TakeQuery.IsQuery(Text), Text)
+
+
+    def testKeysAndNegationAreQueries(self):
+        for Text in ["color:red", "walk frames>300", "LEN<=10", "walk -run", "-run", "-\"run fast\""]:
+            self.assertTrue(TakeQuery.IsQuery(Text), Text)
+
+
+
+class CompileQueryTest(unittest.TestCase):
+    """ Parsing terms into tests, and the errors of terms that can't be parsed. """
+
+
+    def setUp(self):
+        self.Table = FakeTable({
+            "Walk_Forward": {"Color": "red", "Groups": ["locomotion", "player"], "Frames": 120},
+            "Walk_Back": {"Color": "blue", "Groups": ["locomotion"], "Frames": 400},
+            "Run_Fast": {"Groups": ["player"], "Frames": 300},
+            "take:01": {"bIsInvalid": True, "Frames": 10},
+        })
+
+
+    def Find(self, Text: str) -> list[str]:
+        Query = TakeQuery.CompileQuery(Text)
+        return [Take for Take in self.Table.ValuesByTake if Query(Take, self.Table)]
+
+
+    def testErrors(self):
+        for Text, Message in [
+            ("frames>many", "needs a whole number"),
+            ("len:1.5", "needs a whole number"),
+            ("color>red", "can only be compared with ':'"),
+            ("group=player", "can only be compared with ':'"),
+            ("invalid:maybe", "invalid needs true or false"),
+            ("color:\"\"", "is missing a value"),
+            ("-\"\"", "is missing a value"),
+        ]:
+            with self.assertRaises(TakeQuery.QueryError, msg = Text) as Context:
+                TakeQuery.CompileQuery(Text)
+            self.assertIn(Message, str(Context.exception))
+
+
+    def testNameTermsSkipNegatedAndWildcardTerms(self):
+        self.assertEqual(TakeQuery.CompileQuery("Walk -run w*k color:red \"a b\"").NameTerms, ["walk", "a b"])
+
+
+    def testTextKeys(self):
+        self.assertEqual(self.Find("color:red"), ["Walk_Forward"])
+        self.assertEqual(self.Find("color:none"), ["Run_Fast", "take:01"])
+        self.assertEqual(self.Find("group:player"), ["Walk_Forward", "Run_Fast"])
+        self.assertEqual(self.Find("group:loco*"), ["Walk_Forward", "Walk_Back"])
+        self.assertEqual(self.Find("invalid:yes"), ["take:01"])
+        self.assertEqual(self.Find("name:walk_?ack"), ["Walk_Back"])
+
+
+    def testNumberKeys(self):
+        self.assertEqual(self.Find("frames>=300"), ["Walk_Back", "Run_Fast"])
+        self.assertEqual(self.Find("frames<300"), ["Walk_Forward", "take:01"])
+        self.assertEqual(self.Find("frames=120"), ["Walk_Forward"])
+        self.assertEqual(self.Find("len:7"), ["take:01"])
+
+
+    def testTermsAreCombined(self):
+        self.assertEqual(self.Find("walk -back"), ["Walk_Forward"])
+        self.assertEqual(self.Find("group:player -color:red frames>100"), ["Run_Fast"])
+        self.assertEqual(self.Find("WALK GROUP:LOCOMOTION"), ["Walk_Forward", "Walk_Back"])
+
+
+    def testUnknownKeysArePartOfName(self):
+        Query = TakeQuery.CompileQuery("take:01")
+        self.assertEqual(Query.NameTerms, ["take:01"])
+        self.assertEqual(self.Find("take:01"), ["take:01"])
+
+
+
+if __name__ == "__main__":
+    unittest.main()